@@ -0,0 +1,70 @@
+"""peak memory and time of reading and plotting a large skeleton as float64 and float32.
+
+    python benchmarks/float32_memory.py [n_vertices]
+
+the skeleton is a random tree (test/trees.py) written to a temporary swc. peaks are measured with
+tracemalloc, which sees numpy and matplotlib allocations, separately for the read and
+for plot_skel, and for the arrays left alive after each step.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from skeleton_plot import plot_tools, skel_io
+
+# the random trees of the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+from trees import write_random_swc  # noqa: E402
+
+
+def measure(step):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = step()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, current, peak
+
+
+def main(n=100000):
+    directory = tempfile.mkdtemp()
+    # mostly unbranched runs, with 3% of vertices starting a branch off an earlier one
+    write_random_swc(
+        os.path.join(directory, "cell.swc"),
+        n,
+        branch_probability=0.03,
+        scale=500,
+        offset=(4.2e5, 7.1e5, 1.9e5),
+    )
+
+    print(f"{n} vertices")
+    print(f"{'dtype':>8} {'step':>6} {'seconds':>8} {'peak MB':>8} {'kept MB':>8}")
+    for dtype in (None, np.float32):
+        name = "float64" if dtype is None else "float32"
+        sk, seconds, current, peak = measure(
+            lambda: skel_io.read_skeleton(directory, "cell.swc", dtype=dtype)
+        )
+        print(f"{name:>8} {'read':>6} {seconds:8.2f} {peak / 2**20:8.1f} {current / 2**20:8.1f}")
+
+        fig, ax = plt.subplots()
+        _, seconds, current, peak = measure(
+            lambda: plot_tools.plot_skel(
+                sk, ax=ax, pull_radius=True, pull_compartment_colors=True, dtype=dtype
+            )
+        )
+        print(f"{name:>8} {'plot':>6} {seconds:8.2f} {peak / 2**20:8.1f} {current / 2**20:8.1f}")
+        plt.close(fig)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
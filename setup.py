@@ -32,5 +32,6 @@ setup(
     extras_require={"cloud": ["caveclient>=4.0.0", "cloudfiles"]},
     include_package_data=True,
     install_requires=required,
+    entry_points={"console_scripts": ["skeleton-plot=skeleton_plot.cli:main"]},
     setup_requires=["pytest-runner"],
 )
\ No newline at end of file
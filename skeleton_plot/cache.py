@@ -0,0 +1,352 @@
+import collections
+import hashlib
+import inspect
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from matplotlib import colors as mcolors
+
+from . import plot_tools, skel_io, utils
+
+_geometry_digests = utils.VertexCache()
+
+
+class RenderCache:
+    """memoizes rendered skeleton images (png, svg, ...) for a plotting service. images are
+    keyed on a stable hash of the geometry source, every style argument, the format and
+    the output size. hits are served from an in-memory LRU tier, then an optional on-disk
+    tier, without rendering. concurrent requests for the same key wait for one render.
+    safe to share between threads.
+
+    Args:
+        max_items (int, optional): images kept in memory. Defaults to 256.
+        max_bytes (int, optional): total bytes of the images kept in memory.
+            Defaults to None (no limit).
+        directory (str, optional): local directory of the on-disk tier. Defaults to None,
+            memory only.
+
+    Example:
+        cache = RenderCache(directory="/tmp/renders")
+        png = cache.render(("gs://bucket/swcs", "cell_1.swc"), pull_radius=True)
+    """
+
+    def __init__(self, max_items=256, max_bytes=None, directory=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._render_seconds = 0.0
+
+    def key(
+        self, source, fmt="png", figsize=(8, 8), dpi=150, source_key=None, **style
+    ):
+        """stable cache key of a render request, see render. style is bound to the
+        plot function's signature first, so omitted and explicitly passed defaults
+        give the same key"""
+        if source_key is None:
+            source_key = geometry_key(source)
+        plot = _plot_function(source)
+        arguments = inspect.signature(plot).bind_partial(**style)
+        arguments.apply_defaults()
+        style = {
+            k: v for k, v in arguments.arguments.items() if k not in ("sk", "mw", "ax")
+        }
+        return utils.stable_hash(
+            source_key, plot.__name__, _token(style), fmt, _token(figsize), dpi
+        )
+
+    def render(
+        self, source, fmt="png", figsize=(8, 8), dpi=150, source_key=None, **style
+    ):
+        """returns the image of source rendered with plot_skel (skeletons, .swc and .npz
+        files) or plot_mw_skel (meshworks, .h5 files), from the cache when possible
+
+        Args:
+            source: meshparty skeleton, meshwork, or a file as a path or a
+                (directory, filename) tuple, read with skel_io.read_any(skeleton_only=True)
+            fmt (str, optional): image format passed to savefig. Defaults to 'png'.
+            figsize (tuple, optional): figure size. Defaults to (8, 8).
+            dpi (int, optional): figure dpi. Defaults to 150.
+            source_key (optional): json serializable identity of the source, i.e.
+                (cell id, version), used instead of hashing it. Defaults to None.
+            **style: passed to plot_skel or plot_mw_skel
+
+        Returns:
+            image (bytes): the encoded image
+        """
+        key = self.key(
+            source, fmt=fmt, figsize=figsize, dpi=dpi, source_key=source_key, **style
+        )
+        return self.get_or_render(
+            key, lambda: render_image(source, fmt=fmt, figsize=figsize, dpi=dpi, **style)
+        )
+
+    def get_or_render(self, key, render):
+        """returns the cached image of key, calling render() once on a miss. callers
+        asking for a key that is being rendered wait for that render."""
+        with self._lock:
+            self._counts["requests"] += 1
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                self._counts["memory_hits"] += 1
+                return image
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._counts["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            image = self._read_disk(key)
+            if image is not None:
+                with self._lock:
+                    self._counts["disk_hits"] += 1
+            else:
+                start = time.perf_counter()
+                image = render()
+                seconds = time.perf_counter() - start
+                self._write_disk(key, image)
+                with self._lock:
+                    self._counts["renders"] += 1
+                    self._render_seconds += seconds
+        except BaseException as e:
+            with self._lock:
+                self._counts["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._store(key, image)
+            del self._in_flight[key]
+        future.set_result(image)
+        return image
+
+    def _store(self, key, image):
+        self._memory[key] = image
+        self._memory_bytes += len(image)
+        while self._memory and (
+            len(self._memory) > self.max_items
+            or (self.max_bytes is not None and self._memory_bytes > self.max_bytes)
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counts["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, image):
+        if self.directory is None:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so readers never see a partial image
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        """request counts and hit rates. coalesced requests waited on another caller's
+        render and count as hits."""
+        with self._lock:
+            counts = dict(self._counts)
+            memory_items, memory_bytes = len(self._memory), self._memory_bytes
+            render_seconds = self._render_seconds
+        requests = counts.get("requests", 0)
+        hits = sum(counts.get(k, 0) for k in ("memory_hits", "disk_hits", "coalesced"))
+        return {
+            "requests": requests,
+            "memory_hits": counts.get("memory_hits", 0),
+            "disk_hits": counts.get("disk_hits", 0),
+            "coalesced": counts.get("coalesced", 0),
+            "renders": counts.get("renders", 0),
+            "errors": counts.get("errors", 0),
+            "evictions": counts.get("evictions", 0),
+            "hit_rate": hits / requests if requests else None,
+            "memory_hit_rate": (
+                counts.get("memory_hits", 0) / requests if requests else None
+            ),
+            "memory_items": memory_items,
+            "memory_bytes": memory_bytes,
+            "render_seconds": render_seconds,
+        }
+
+    def clear(self, disk=False):
+        """empties the memory tier, and the disk tier if disk"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if disk and self.directory is not None:
+            for entry in os.listdir(self.directory):
+                path = os.path.join(self.directory, entry)
+                if os.path.isdir(path):
+                    for name in os.listdir(path):
+                        os.remove(os.path.join(path, name))
+
+
+def render_image(source, fmt="png", figsize=(8, 8), dpi=150, **style):
+    """renders source (see RenderCache.render) on a new Agg figure and returns the encoded
+    image. pyplot is not used, so threads can render at the same time."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    plot = _plot_function(source)
+    obj = _load_source(source, style.get("dtype"))
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    plot(obj, ax=ax, **style)
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+
+def _plot_function(source):
+    """plot_mw_skel for meshworks and .h5 files, plot_skel otherwise"""
+    if isinstance(source, (str, os.PathLike)):
+        filename = os.fspath(source)
+    elif isinstance(source, tuple):
+        filename = source[1]
+    else:
+        if hasattr(source, "anno"):
+            return plot_tools.plot_mw_skel
+        return plot_tools.plot_skel
+    if filename.lower().endswith(".h5"):
+        return plot_tools.plot_mw_skel
+    return plot_tools.plot_skel
+
+
+def _load_source(source, dtype=None):
+    if isinstance(source, (str, os.PathLike)):
+        return skel_io.read_any(
+            *os.path.split(os.fspath(source)), dtype=dtype, skeleton_only=True
+        )
+    if isinstance(source, tuple):
+        return skel_io.read_any(*source, dtype=dtype, skeleton_only=True)
+    return source
+
+
+def geometry_key(source):
+    """stable identity of a geometry source: the path and, for local files, size and
+    mtime, or a digest of the skeleton arrays (and anno tables) of an in-memory object.
+    digests are cached per object and redone if its vertices change."""
+    if isinstance(source, (str, os.PathLike)):
+        source = os.path.split(os.fspath(source))
+    if isinstance(source, tuple):
+        directory, filename = source
+        return ["file", directory, filename, utils.file_fingerprint(directory, filename)]
+
+    sk = source.skeleton if hasattr(source, "anno") else source
+    return _geometry_digests.get(source, sk.vertices, lambda: _object_key(source, sk))
+
+
+def _object_key(source, sk):
+    digest = hashlib.sha1()
+    for array in (sk.vertices, sk.edges, [sk.root]):
+        _update_digest(digest, np.asarray(array))
+    for name, values in sorted((sk.vertex_properties or {}).items()):
+        digest.update(name.encode())
+        _update_digest(digest, np.asarray(values))
+    if hasattr(source, "anno"):
+        for name in sorted(source.anno.table_names):
+            digest.update(name.encode())
+            _update_digest(digest, _table_digest(source.anno[name].df))
+    return ["object", digest.hexdigest()]
+
+
+def _table_digest(df):
+    """row hashes of an anno table. columns of arrays (point columns) are stacked first"""
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if len(values) and isinstance(values.iloc[0], (np.ndarray, list, tuple)):
+            columns[column] = pd.Series(list(map(tuple, np.vstack(values.values))))
+        else:
+            columns[column] = values.reset_index(drop=True)
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).values
+
+
+def _update_digest(digest, array):
+    array = np.ascontiguousarray(array)
+    if array.dtype == object:
+        digest.update(repr(array.tolist()).encode())
+        return
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(array.tobytes())
+
+
+def _token(value):
+    """json friendly stand in for a style value that is the same in every process.
+    arrays and series are replaced by a digest of their bytes, since their repr elides
+    most values, norms by their class and parameters, colormaps by their lookup table
+    and dtypes by their name. dicts become sorted [key, value] pairs. other objects have no stable repr (it holds their memory
+    address) and raise a TypeError"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, pd.Series):
+        value = value.values
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha1()
+        _update_digest(digest, value)
+        return ["ndarray", digest.hexdigest()]
+    if isinstance(value, dict):
+        # pairs keep the key types, so {3: 'red'} and {'3': 'red'} differ
+        pairs = [[_token(k), _token(v)] for k, v in value.items()]
+        return ["dict", sorted(pairs, key=lambda pair: json.dumps(pair[0]))]
+    if isinstance(value, (list, tuple)):
+        return [_token(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.dtype) or (
+        isinstance(value, type) and issubclass(value, np.generic)
+    ):
+        return ["dtype", np.dtype(value).name]
+    if isinstance(value, mcolors.Normalize):
+        # vmin, vmax, clip and subclass parameters (vcenter, gamma, boundaries, ...)
+        parameters = {
+            k.lstrip("_"): _token(v)
+            for k, v in vars(value).items()
+            if v is None or isinstance(v, (bool, int, float, str, np.generic, np.ndarray))
+        }
+        return [type(value).__name__, parameters]
+    if isinstance(value, mcolors.Colormap):
+        # the lookup table, since names are shared by different from_list colormaps
+        lut = np.vstack(
+            [
+                value(np.linspace(0, 1, value.N)),
+                [value.get_over(), value.get_under(), value.get_bad()],
+            ]
+        )
+        return ["Colormap", _token(lut)]
+    raise TypeError(
+        f"cannot build a cache key from style value {value!r} of type "
+        f"{type(value).__name__}; pass arrays, numbers, strings, norms or colormaps"
+    )
@@ -0,0 +1,324 @@
+"""skeleton-plot: render every skeleton in a manifest to an output directory
+
+each manifest item (a csv row or a json object) needs a ``directory`` and a
+``filename`` readable by skel_io.read_any. the optional ``output`` sets the output
+filename stem, ``figsize``, ``dpi`` and ``format`` set up the figure, and every other
+column is passed as a keyword argument to plot_tools.plot_skel (.swc, .npz) or
+plot_tools.plot_mw_skel (.h5). a json manifest is either a list of items or
+{"defaults": {...}, "items": [...]}.
+
+outputs are named by a hash of the input and its options, so re-running the same
+manifest skips finished items and an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import skel_io, utils
+
+FIGURE_KEYS = ("figsize", "dpi", "format")
+FIGURE_DEFAULTS = {"figsize": [8, 8], "dpi": 150}
+INPUT_KEYS = ("directory", "filename", "output")
+PROGRESS_FILE = "progress.jsonl"
+SUMMARY_FILE = "summary.json"
+
+
+def read_manifest(path):
+    """reads a csv or json manifest into a list of item dicts. csv cells are parsed as
+    json where possible (so 3.5, true and [8, 8] become numbers, bools and lists) and
+    empty cells are dropped."""
+    if path.lower().endswith(".json"):
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict):
+            defaults = manifest.get("defaults", {})
+            return [_parse_item({**defaults, **item}) for item in manifest["items"]]
+        return [_parse_item(item) for item in manifest]
+
+    items = []
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            items.append(
+                _parse_item(
+                    {
+                        key: _parse_cell(value)
+                        for key, value in row.items()
+                        if key is not None and value is not None and value != ""
+                    }
+                )
+            )
+    return items
+
+
+def _parse_cell(value):
+    if value in ("True", "False"):
+        return value == "True"
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _parse_item(item):
+    """json object keys are always strings, but skel_color_map is keyed by the integer
+    compartment labels, so a map whose keys are all integer-like gets int keys back"""
+    color_map = item.get("skel_color_map")
+    if isinstance(color_map, dict):
+        try:
+            color_map = {int(label): color for label, color in color_map.items()}
+        except ValueError:
+            return item
+        item = {**item, "skel_color_map": color_map}
+    return item
+
+
+def item_key(item, fmt="png", dtype=None):
+    """stable hash of an item's input (path and local file fingerprint), its options and
+    the run options that change the output: the default format and the geometry dtype"""
+    options = {k: v for k, v in item.items() if k != "output"}
+    figure = {k: item.get(k, default) for k, default in FIGURE_DEFAULTS.items()}
+    figure["format"] = item.get("format", fmt)
+    run = {"dtype": None if dtype is None else np.dtype(dtype).name}
+    fingerprint = utils.file_fingerprint(item["directory"], item["filename"])
+    return utils.stable_hash(options, figure, run, fingerprint)[:16]
+
+
+def output_name(item, key, fmt="png"):
+    stem = item.get("output")
+    if stem is None:
+        stem = os.path.splitext(os.path.basename(item["filename"]))[0]
+    return f"{stem}_{key}.{item.get('format', fmt)}"
+
+
+def render_item(item, out_path, dtype=None):
+    """loads one manifest item, plots it on a new Agg figure and saves it to out_path.
+    pyplot and the global backend are left alone.
+
+    Returns:
+        seconds (float): time spent loading and rendering
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from . import plot_tools
+
+    start = time.perf_counter()
+    style = {
+        k: v for k, v in item.items() if k not in FIGURE_KEYS and k not in INPUT_KEYS
+    }
+    # meshworks are read without their mesh, which plot_mw_skel never uses
+    obj = skel_io.read_any(
+        item["directory"], item["filename"], dtype=dtype, skeleton_only=True
+    )
+
+    fig = Figure(figsize=item.get("figsize", FIGURE_DEFAULTS["figsize"]))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if item["filename"].lower().endswith(".h5"):
+        plot_tools.plot_mw_skel(obj, ax=ax, dtype=dtype, **style)
+    else:
+        plot_tools.plot_skel(obj, ax=ax, dtype=dtype, **style)
+    # write then rename so an interrupted save never leaves a finished-looking file
+    tmp_path = out_path + ".tmp"
+    fig.savefig(
+        tmp_path,
+        dpi=item.get("dpi", FIGURE_DEFAULTS["dpi"]),
+        format=os.path.splitext(out_path)[1][1:],
+        bbox_inches="tight",
+    )
+    os.replace(tmp_path, out_path)
+    return time.perf_counter() - start
+
+
+def _render_worker(item, out_path, dtype):
+    try:
+        return render_item(item, out_path, dtype=dtype), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def run_manifest(
+    manifest, out_dir, n_workers=1, fmt="png", dtype=None, force=False, defaults=None
+):
+    """renders every item in manifest into out_dir, skipping items whose output already
+    exists. progress is appended to out_dir/progress.jsonl as items finish and
+    out_dir/summary.json is rebuilt from it, so resumed runs keep earlier timings.
+
+    Args:
+        manifest (list or str): list of item dicts, or path to a csv/json manifest
+        out_dir (str): local output directory
+        n_workers (int, optional): number of worker processes. Defaults to 1, which
+            renders in this process.
+        fmt (str, optional): output format if the item has none. Defaults to 'png'.
+        dtype (np.dtype, optional): geometry dtype passed to the read and plot
+            functions, i.e. np.float32. Defaults to None.
+        force (bool, optional): re-render items whose output exists. Defaults to False.
+        defaults (dict, optional): options applied to every item. Defaults to None.
+
+    Returns:
+        summary (dict): see summarize, over every run into out_dir, plus the counts and
+            seconds of this run under 'run'
+    """
+    if isinstance(manifest, str):
+        manifest = read_manifest(manifest)
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    run = {"n_rendered": 0, "n_skipped": 0, "n_failed": 0}
+    outputs = []
+    todo = {}
+    for item in manifest:
+        item = _parse_item({**(defaults or {}), **item})
+        key = item_key(item, fmt=fmt, dtype=dtype)
+        out_path = os.path.join(out_dir, output_name(item, key, fmt=fmt))
+        outputs.append(os.path.basename(out_path))
+        if not force and os.path.exists(out_path):
+            run["n_skipped"] += 1
+            continue
+        todo[out_path] = item
+
+    progress = open(os.path.join(out_dir, PROGRESS_FILE), "a")
+
+    def record(out_path, seconds, error):
+        item = todo[out_path]
+        entry = {
+            "output": os.path.basename(out_path),
+            "filename": item["filename"],
+            "seconds": seconds,
+        }
+        if error is None:
+            run["n_rendered"] += 1
+            entry["status"] = "ok"
+        else:
+            run["n_failed"] += 1
+            entry["status"] = "failed"
+            entry["error"] = error
+        progress.write(json.dumps(entry) + "\n")
+        progress.flush()
+
+    try:
+        if n_workers == 1:
+            for out_path, item in todo.items():
+                record(out_path, *_render_worker(item, out_path, dtype))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = {
+                    pool.submit(_render_worker, item, out_path, dtype): out_path
+                    for out_path, item in todo.items()
+                }
+                for future in as_completed(futures):
+                    record(futures[future], *future.result())
+    finally:
+        progress.close()
+        run["seconds"] = time.perf_counter() - start
+        summary = summarize(out_dir, outputs)
+        summary["run"] = run
+        with open(os.path.join(out_dir, SUMMARY_FILE), "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return summary
+
+
+def summarize(out_dir, outputs):
+    """state of a manifest's outputs rebuilt from progress.jsonl, so the summary covers
+    every run that wrote to out_dir, not only the last one. the last entry of an output
+    wins; outputs that exist without an entry have no timing.
+
+    Args:
+        out_dir (str): output directory of run_manifest
+        outputs (list): output filenames of the manifest items
+
+    Returns:
+        summary (dict): n_items, n_done (outputs that exist), n_failed, n_pending,
+            timings of the done outputs, their total and mean seconds, and failures
+    """
+    latest = {}
+    progress_path = os.path.join(out_dir, PROGRESS_FILE)
+    if os.path.exists(progress_path):
+        with open(progress_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a line cut short by a killed run
+                    continue
+                latest[entry["output"]] = entry
+
+    timings, failures = {}, {}
+    for name in outputs:
+        entry = latest.get(name, {})
+        if os.path.exists(os.path.join(out_dir, name)):
+            timings[name] = entry.get("seconds") if entry.get("status") == "ok" else None
+        elif entry.get("status") == "failed":
+            failures[name] = {"filename": entry["filename"], "error": entry.get("error")}
+
+    seconds = [t for t in timings.values() if t is not None]
+    return {
+        "n_items": len(outputs),
+        "n_done": len(timings),
+        "n_failed": len(failures),
+        "n_pending": len(outputs) - len(timings) - len(failures),
+        "render_seconds": float(np.sum(seconds)),
+        "mean_seconds": float(np.mean(seconds)) if seconds else None,
+        "timings": timings,
+        "failures": failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="skeleton-plot",
+        description="render every skeleton in a csv or json manifest to an output directory",
+    )
+    parser.add_argument("manifest", help="csv or json manifest of inputs and style options")
+    parser.add_argument("out_dir", help="output directory")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--format", default="png", help="output format for items without one (png, svg, pdf)"
+    )
+    parser.add_argument("--dpi", type=int, default=None, help="default dpi")
+    parser.add_argument(
+        "--figsize", type=float, nargs=2, default=None, help="default figure size"
+    )
+    parser.add_argument(
+        "--float32", action="store_true", help="keep the plotted geometry in float32"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="re-render items whose output exists"
+    )
+    args = parser.parse_args(argv)
+
+    defaults = {}
+    if args.dpi is not None:
+        defaults["dpi"] = args.dpi
+    if args.figsize is not None:
+        defaults["figsize"] = args.figsize
+
+    summary = run_manifest(
+        args.manifest,
+        args.out_dir,
+        n_workers=args.workers,
+        fmt=args.format,
+        dtype=np.float32 if args.float32 else None,
+        force=args.force,
+        defaults=defaults,
+    )
+    run = summary["run"]
+    print(
+        f"rendered {run['n_rendered']}, skipped {run['n_skipped']}, "
+        f"failed {run['n_failed']} of {summary['n_items']} in {run['seconds']:.1f}s; "
+        f"{summary['n_done']} of {summary['n_items']} done"
+    )
+    return 1 if summary["n_failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import skel_io, utils
+
+WRITERS = {"swc": skel_io.write_swc, "compact": skel_io.write_compact}
+EXTENSIONS = {"swc": ".swc", "compact": ".npz"}
+
+
+def mw_skeleton_features(
+    mw,
+    radius_anno="segment_properties",
+    basal_anno="basal_mesh_labels",
+    apical_anno="apical_mesh_labels",
+    axon_anno="is_axon",
+):
+    """pulls the skeleton, radius and compartment labels out of a meshwork, the same way
+    plot_mw_skel does with pull_radius and pull_compartment_colors
+
+    Args:
+        mw (meshwork): meshwork to convert
+        radius_anno (str, optional): anno table with radius information. if not in mw.anno,
+            radius is left as None. Defaults to "segment_properties".
+        basal_anno (str, optional): anno table with (basal) dendrite mesh labels.
+            Defaults to "basal_mesh_labels".
+        apical_anno (str, optional): anno table with apical mesh labels. can be None.
+            Defaults to "apical_mesh_labels".
+        axon_anno (str, optional): anno table with axon labels. Defaults to "is_axon".
+
+    Returns:
+        sk (meshparty.skeleton.Skeleton): the meshwork skeleton
+        radius (np.array or None): radius of each skeleton vertex
+        compartment (np.array): swc type of each skeleton vertex
+    """
+    radius = None
+    if radius_anno is not None and radius_anno in mw.anno.table_names:
+        radius = utils.pull_mw_rad(mw, radius_anno)
+    compartment = utils.pull_mw_skel_colors(mw, basal_anno, axon_anno, apical_anno)
+    return mw.skeleton, radius, compartment
+
+
+def convert_mw(directory, filename, out_directory, fmt="swc", out_filename=None, **kwargs):
+    """loads a meshwork with skel_io.load_mw and writes its skeleton, radius and
+    compartments as an swc (skel_io.write_swc) or compact .npz (skel_io.write_compact)
+
+    Args:
+        directory (str): directory location of meshwork .h5 file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full .h5 filename
+        out_directory (str): local directory or cloudpath to write to
+        fmt (str, optional): 'swc' or 'compact'. Defaults to 'swc'.
+        out_filename (str, optional): output filename. Defaults to filename with the
+            extension of fmt.
+        **kwargs: anno table names passed to mw_skeleton_features
+
+    Returns:
+        path (str): path of the written file
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"fmt must be one of {list(WRITERS)}, got '{fmt}'")
+    if out_filename is None:
+        out_filename = os.path.splitext(filename)[0] + EXTENSIONS[fmt]
+
+    mw = skel_io.load_mw(directory, filename)
+    sk, radius, compartment = mw_skeleton_features(mw, **kwargs)
+    return WRITERS[fmt](
+        sk, out_directory, out_filename, radius=radius, compartment=compartment
+    )
+
+
+def convert_meshworks(
+    directory, filenames, out_directory, fmt="swc", n_workers=None, **kwargs
+):
+    """converts many meshwork .h5 files to swc or compact skeleton files across a
+    process pool. see convert_mw.
+
+    Args:
+        directory (str): directory location of the meshwork .h5 files. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
+        filenames (list): .h5 filenames in directory
+        out_directory (str): local directory or cloudpath to write to
+        fmt (str, optional): 'swc' or 'compact'. Defaults to 'swc'.
+        n_workers (int, optional): number of worker processes. Defaults to None, which
+            uses os.cpu_count(). with n_workers=1 files are converted in this process.
+        **kwargs: anno table names passed to mw_skeleton_features
+
+    Returns:
+        results (dict): filename -> written path, for the files that converted
+        failures (dict): filename -> exception, for the files that did not
+    """
+    results = {}
+    failures = {}
+
+    if n_workers == 1:
+        for filename in filenames:
+            try:
+                results[filename] = convert_mw(
+                    directory, filename, out_directory, fmt=fmt, **kwargs
+                )
+            except Exception as e:
+                failures[filename] = e
+        return results, failures
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = {
+            pool.submit(
+                convert_mw, directory, filename, out_directory, fmt=fmt, **kwargs
+            ): filename
+            for filename in filenames
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                results[filename] = future.result()
+            except Exception as e:
+                failures[filename] = e
+    return results, failures
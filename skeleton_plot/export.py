@@ -0,0 +1,226 @@
+import json
+
+import numpy as np
+from matplotlib import colors as mcolors
+
+from . import skel_io, utils
+
+FORMAT_VERSION = 1
+
+
+def export_verts(
+    vertices,
+    edges,
+    directory,
+    name,
+    radius=None,
+    skel_colors=None,
+    color="darkslategray",
+    skel_color_map={3: "firebrick", 4: "salmon", 2: "steelblue", 1: "olive"},
+    axes=("x", "y", "z"),
+    soma_node=0,
+    position_bits=16,
+):
+    """writes skeleton geometry as a compact binary blob (name.bin) plus a json manifest
+    (name.json) that a browser can load straight into typed arrays.
+
+    the blob holds, each 4-byte aligned and little-endian:
+        positions: uint16 (or uint8) quantized coordinates, n x len(axes).
+            position = value * scale + offset, with scale and offset in the manifest
+        segments: uint16 (or uint32) vertex index pairs, one line per edge
+        color_index: uint8 palette index of each vertex, if skel_colors is given
+        radius: uint16 quantized radius of each vertex, if radius is given.
+            radius = value * radius_scale
+    the manifest lists each buffer's byte_offset, length, dtype and item_size, and the
+    palette of rgba colors built from skel_color_map, as in plot_verts.
+
+    Args:
+        vertices (np.array, nx3): skeleton vertices
+        edges (np.array, nx2): edges between vertices
+        directory (str): output directory, local or a cloudpath as seen in
+            https://github.com/seung-lab/cloud-files
+        name (str): base name of the .bin and .json files
+        radius (iterable, optional): radius of each vertex. Defaults to None.
+        skel_colors (iterable, optional): compartment label of each vertex, mapped through
+            skel_color_map. Defaults to None, which colors every vertex with color.
+        color (str, optional): color of all vertices if skel_colors is None.
+            Defaults to 'darkslategray'.
+        skel_color_map (dict, optional): map of skel_colors values->colors.
+            Defaults to {3: "firebrick", 4: "salmon", 2: "steelblue", 1: "olive"}.
+        axes (tuple, optional): dimensions to export. ('x', 'y') exports the projected 2d
+            geometry. Defaults to ('x', 'y', 'z').
+        soma_node (int, optional): index of the soma vertex, stored in the manifest.
+            Defaults to 0.
+        position_bits (int, optional): 8 or 16 bits per quantized coordinate.
+            Defaults to 16.
+
+    Returns:
+        manifest (dict): the manifest written to name.json
+    """
+    if position_bits not in (8, 16):
+        raise ValueError(f"position_bits must be 8 or 16, got {position_bits}")
+
+    vertices = np.asarray(vertices)
+    edges = np.asarray(edges)
+    positions = vertices[:, [utils.axis_dict[a] for a in axes]].astype(np.float64)
+
+    # quantize every axis with the same scale so the geometry keeps its aspect ratio
+    levels = 2**position_bits - 1
+    offset = positions.min(axis=0) if len(positions) else np.zeros(len(axes))
+    extent = float(np.max(positions.max(axis=0) - offset)) if len(positions) else 0.0
+    scale = extent / levels if extent > 0 else 1.0
+    position_dtype = np.uint8 if position_bits == 8 else np.uint16
+    quantized = np.rint((positions - offset) / scale).astype(position_dtype)
+
+    index_dtype = np.uint16 if len(vertices) <= np.iinfo(np.uint16).max else np.uint32
+    buffers = {
+        "positions": quantized,
+        "segments": edges.astype(index_dtype),
+    }
+
+    if skel_colors is None:
+        palette = [color]
+    else:
+        skel_colors = np.broadcast_to(
+            np.asarray(utils.ensure_length(skel_colors, len(vertices))), len(vertices)
+        )
+        labels = list(skel_color_map.keys())
+        if len(labels) > 256:
+            raise ValueError("skel_color_map has more than 256 colors")
+        # vectorized label -> palette index lookup
+        sorter = np.argsort(labels)
+        position = np.searchsorted(np.asarray(labels)[sorter], skel_colors)
+        position = np.clip(position, 0, len(labels) - 1)
+        known = np.asarray(labels)[sorter][position] == skel_colors
+        if not np.all(known):
+            missing = np.unique(skel_colors[~known])
+            raise KeyError(f"skel_colors values {missing} not in skel_color_map")
+        buffers["color_index"] = sorter[position].astype(np.uint8)
+        palette = [skel_color_map[label] for label in labels]
+
+    radius_scale = None
+    if radius is not None:
+        radius = np.broadcast_to(
+            np.asarray(
+                utils.ensure_length(radius, len(vertices), feature_name="radius"),
+                dtype=np.float64,
+            ),
+            len(vertices),
+        )
+        max_radius = float(np.max(radius)) if len(radius) else 0.0
+        radius_scale = max_radius / 65535 if max_radius > 0 else 1.0
+        buffers["radius"] = np.rint(radius / radius_scale).astype(np.uint16)
+
+    blob = bytearray()
+    layout = {}
+    for key, array in buffers.items():
+        array = np.ascontiguousarray(array)
+        blob.extend(b"\0" * (-len(blob) % 4))
+        layout[key] = {
+            "byte_offset": len(blob),
+            "length": int(array.size),
+            "dtype": array.dtype.name,
+            "item_size": int(array.shape[1]) if array.ndim == 2 else 1,
+        }
+        blob.extend(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes())
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "n_vertices": int(len(vertices)),
+        "n_segments": int(len(edges)),
+        "axes": list(axes),
+        "offset": offset.tolist(),
+        "scale": scale,
+        "radius_scale": radius_scale,
+        "soma_node": int(soma_node),
+        "palette": mcolors.to_rgba_array(palette).round(4).tolist(),
+        "buffers": layout,
+        "bin": f"{name}.bin",
+    }
+
+    skel_io._write_file(directory, f"{name}.bin", bytes(blob))
+    skel_io._write_file(directory, f"{name}.json", json.dumps(manifest).encode())
+    return manifest
+
+
+def export_skel(
+    sk,
+    directory,
+    name,
+    pull_radius=False,
+    radius=None,
+    pull_compartment_colors=False,
+    skel_colors=None,
+    soma_node=None,
+    **kwargs,
+):
+    """exports a meshparty skeleton with export_verts, pulling radius and compartments
+    from sk.vertex_properties like plot_skel
+
+    Args:
+        sk (meshparty.skeleton.Skeleton): skeleton to export
+        directory (str): output directory, local or a cloudpath
+        name (str): base name of the .bin and .json files
+        pull_radius (bool, optional): export sk.vertex_properties['radius'].
+            Defaults to False.
+        radius (iterable, optional): radius of each vertex. overwritten if pull_radius.
+            Defaults to None.
+        pull_compartment_colors (bool, optional): export sk.vertex_properties['compartment']
+            as colors. Defaults to False.
+        skel_colors (iterable, optional): compartment label of each vertex. Defaults to None.
+        soma_node (int, optional): index of the soma vertex. Defaults to sk.root.
+        **kwargs: passed to export_verts
+
+    Returns:
+        manifest (dict): the manifest written to name.json
+    """
+    if skel_colors is None and pull_compartment_colors:
+        skel_colors = sk.vertex_properties["compartment"]
+    if pull_radius:
+        radius = sk.vertex_properties["radius"]
+    if soma_node is None:
+        soma_node = int(sk.root)
+    return export_verts(
+        sk.vertices,
+        sk.edges,
+        directory,
+        name,
+        radius=radius,
+        skel_colors=skel_colors,
+        soma_node=soma_node,
+        **kwargs,
+    )
+
+
+def load_export(directory, name):
+    """reads files written by export_verts back into arrays, dequantized. directory is
+    local or a cloudpath
+
+    Returns:
+        arrays (dict): positions, segments and, if exported, colors (rgba per vertex) and radius
+        manifest (dict): the manifest
+    """
+    manifest = json.loads(skel_io._read_file(directory, f"{name}.json"))
+    blob = skel_io._read_file(directory, manifest["bin"])
+
+    arrays = {}
+    for key, entry in manifest["buffers"].items():
+        array = np.frombuffer(
+            blob,
+            dtype=np.dtype(entry["dtype"]).newbyteorder("<"),
+            count=entry["length"],
+            offset=entry["byte_offset"],
+        )
+        if entry["item_size"] > 1:
+            array = array.reshape(-1, entry["item_size"])
+        arrays[key] = array
+
+    arrays["positions"] = arrays["positions"] * manifest["scale"] + np.asarray(
+        manifest["offset"]
+    )
+    palette = np.asarray(manifest["palette"])
+    if "color_index" in arrays:
+        arrays["colors"] = palette[arrays.pop("color_index")]
+    if "radius" in arrays:
+        arrays["radius"] = arrays["radius"] * manifest["radius_scale"]
+    return arrays, manifest
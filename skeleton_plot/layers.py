@@ -0,0 +1,203 @@
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+from . import utils
+
+
+class LayerGeometry:
+    """cortical layer polygons from a layer bounds json (see skel_io.read_json)
+    with vectorized point-in-polygon labeling of vertices and synapses.
+
+    Args:
+        layer_poly_json (dict): layer dict as returned by skel_io.read_json. polygons are
+            read from the 'layer_polygons' entry, every other entry with a 'path'
+            (i.e. pia_path, wm_path) is kept as a boundary.
+        res (float, optional): scale applied to the json coordinates. Defaults to 0.3603.
+        outside_label (int, optional): label given to points that fall in no layer.
+            Defaults to -1.
+    """
+
+    def __init__(self, layer_poly_json, res=0.3603, outside_label=-1):
+        self.res = res
+        self.outside_label = outside_label
+
+        self.names = []
+        self.polygons = []
+        for layer in layer_poly_json.get("layer_polygons", []):
+            self.names.append(layer.get("name", str(len(self.names))))
+            self.polygons.append(np.asarray(layer["path"], dtype=float)[:, :2] * res)
+
+        self.boundaries = {
+            key: np.asarray(value["path"], dtype=float)[:, :2] * res
+            for key, value in layer_poly_json.items()
+            if key != "layer_polygons" and isinstance(value, dict) and "path" in value
+        }
+
+        # edges of every polygon stacked as (x0, y0, x1, y1) with the polygon each
+        # edge belongs to, so a single broadcast tests all layers at once
+        edges = []
+        edge_layer = []
+        for i, poly in enumerate(self.polygons):
+            edges.append(np.hstack([poly, np.roll(poly, -1, axis=0)]))
+            edge_layer.append(np.full(len(poly), i))
+        if len(edges) > 0:
+            self._edges = np.vstack(edges)
+            self._edge_layer = np.concatenate(edge_layer)
+        else:
+            self._edges = np.empty((0, 4))
+            self._edge_layer = np.empty(0, dtype=int)
+
+        # horizontal edges never cross a ray cast along x, drop them up front
+        keep = self._edges[:, 1] != self._edges[:, 3]
+        self._edges = self._edges[keep]
+        self._edge_layer = self._edge_layer[keep]
+        self._slope = (self._edges[:, 2] - self._edges[:, 0]) / (
+            self._edges[:, 3] - self._edges[:, 1]
+        )
+
+    def __len__(self):
+        return len(self.polygons)
+
+    @property
+    def vertices(self):
+        """all polygon and boundary vertices stacked, nx2"""
+        parts = self.polygons + list(self.boundaries.values())
+        if len(parts) == 0:
+            return np.empty((0, 2))
+        return np.vstack(parts)
+
+    def contains(self, points, x="x", y="y", chunk_size=4096):
+        """tests which layer polygons contain each point (even-odd rule)
+
+        Args:
+            points (np.array, nx2+): points to test. if nx3, x and y select the columns.
+            x (str, optional): which dimension of points is x. Defaults to 'x'.
+            y (str, optional): which dimension of points is y. Defaults to 'y'.
+            chunk_size (int, optional): number of points tested per broadcast.
+                Bounds memory to chunk_size * number of edges. Defaults to 4096.
+
+        Returns:
+            inside (np.array, n x n_layers): boolean array, True where point i is in layer j
+        """
+        xy = utils.project_verts(points, x=x, y=y)
+
+        inside = np.zeros((len(xy), len(self)), dtype=bool)
+        if len(self._edges) == 0:
+            return inside
+        # points are visited sorted by y so each chunk only broadcasts against the
+        # edges spanning its y range. edges stay stacked layer by layer, so parity
+        # per layer is an xor over each contiguous run of edge columns
+        order = np.argsort(xy[:, 1], kind="stable")
+        order = order[np.isfinite(xy[order]).all(axis=1)]
+        edge_ymin = np.minimum(self._edges[:, 1], self._edges[:, 3])
+        edge_ymax = np.maximum(self._edges[:, 1], self._edges[:, 3])
+        # order has the non-finite points dropped, so it can be shorter than xy
+        for start in range(0, len(order), chunk_size):
+            idx = order[start : start + chunk_size]
+            px = xy[idx, 0][:, None]
+            py = xy[idx, 1][:, None]
+            near = (edge_ymax >= py[0, 0]) & (edge_ymin <= py[-1, 0])
+            if not near.any():
+                continue
+            x0, y0, _, y1 = self._edges[near].T
+            layers, starts = np.unique(self._edge_layer[near], return_index=True)
+            crosses = ((y0 > py) != (y1 > py)) & (px < x0 + (py - y0) * self._slope[near])
+            inside[idx[:, None], layers] = np.logical_xor.reduceat(crosses, starts, axis=1)
+        return inside
+
+    def assign(self, points, x="x", y="y", chunk_size=4096):
+        """labels each point with the index of the layer containing it
+
+        Args:
+            points (np.array, nx2+): points (skeleton vertices, synapses) to label.
+            x (str, optional): which dimension of points is x. Defaults to 'x'.
+            y (str, optional): which dimension of points is y. Defaults to 'y'.
+            chunk_size (int, optional): number of points tested per broadcast. Defaults to 4096.
+
+        Returns:
+            labels (np.array): layer index of each point, or outside_label if the point
+                is in no layer. usable as skel_colors with layer_color_map in plot_skel.
+        """
+        inside = self.contains(points, x=x, y=y, chunk_size=chunk_size)
+        labels = np.where(inside.any(axis=1), inside.argmax(axis=1), self.outside_label)
+        return labels
+
+    def assign_names(self, points, x="x", y="y", outside_name=None):
+        """like assign, but returns the layer name for each point"""
+        labels = self.assign(points, x=x, y=y)
+        names = np.array(self.names + [outside_name], dtype=object)
+        labels = np.where(labels == self.outside_label, len(self.names), labels)
+        return names[labels]
+
+    def layer_color_map(self, colors=None, outside_color="lightgray"):
+        """builds a skel_color_map for labels returned by assign
+
+        Args:
+            colors (list, optional): one color per layer. Defaults to the matplotlib
+                color cycle.
+            outside_color (str, optional): color of points outside every layer.
+                Defaults to 'lightgray'.
+
+        Returns:
+            skel_color_map (dict): map of layer label->color
+        """
+        if colors is None:
+            cycle = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+            colors = [cycle[i % len(cycle)] for i in range(len(self))]
+        color_map = dict(zip(range(len(self)), colors))
+        color_map[self.outside_label] = outside_color
+        return color_map
+
+    def plot(
+        self,
+        ax=None,
+        fill=False,
+        colors=None,
+        edgecolor="gray",
+        alpha=0.3,
+        linewidth=1,
+        invert_y=True,
+        set_lims=True,
+    ):
+        """draws the layer polygons as a single PolyCollection
+
+        Args:
+            ax (matplotlib.axes, optional): axis on which to plot the layers
+                If none is given, will find current axis with plt.gca()
+            fill (bool, optional): whether to fill the polygons or only outline them.
+                Defaults to False.
+            colors (list, optional): face color of each layer if fill. Defaults to the
+                matplotlib color cycle.
+            edgecolor (str, optional): color of polygon outlines. Defaults to 'gray'.
+            alpha (float, optional): opacity of the filled polygons. Defaults to 0.3.
+            linewidth (float, optional): width of polygon outlines. Defaults to 1.
+            invert_y (bool, optional): whether or not to invert the y axis. Defaults to True.
+            set_lims (bool, optional): whether to set the axis limits to the layers.
+                Defaults to True.
+
+        Returns:
+            pc (matplotlib.collections.PolyCollection): the added collection
+        """
+        if ax is None:
+            ax = plt.gca()
+
+        if fill:
+            if colors is None:
+                colors = list(self.layer_color_map().values())[: len(self)]
+            facecolors = colors
+        else:
+            facecolors = "none"
+
+        pc = PolyCollection(
+            self.polygons,
+            facecolors=facecolors,
+            edgecolors=edgecolor,
+            linewidths=linewidth,
+            alpha=alpha if fill else None,
+        )
+        ax.add_collection(pc)
+
+        if set_lims and len(self.vertices) > 0:
+            utils.set_xy_lims(ax=ax, verts=self.vertices, invert_y=invert_y)
+        return pc
@@ -0,0 +1,244 @@
+import threading
+import weakref
+
+import numpy as np
+from matplotlib.collections import LineCollection
+
+# id(vertices) -> (weak reference to vertices, {key: (weak reference to edges, lod)})
+_lod_cache = {}
+_lod_lock = threading.Lock()
+
+
+class SkeletonLOD:
+    """resolution pyramid of a projected skeleton. level k keeps every 2**k-th vertex of
+    each cover path, plus the path ends so tips and branch points stay connected, and
+    draws one segment between consecutive kept vertices. level 0 is the full skeleton.
+    built once per skeleton and projection (see cached_lod), the levels are then only
+    indexed on zoom and pan.
+
+    Args:
+        xy (np.array, nx2): projected vertices in plot coordinates
+        paths (list): cover paths of vertex indices, i.e. sk.cover_paths_with_parent()
+        max_levels (int, optional): maximum number of levels. Defaults to 16.
+
+    Attributes:
+        levels (list): per level, (start, end) vertex indices of its segments
+    """
+
+    def __init__(self, xy, paths, max_levels=16):
+        self.xy = _owned(xy)
+        lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        if len(lengths):
+            vertex = np.concatenate(paths).astype(np.int64)
+        else:
+            vertex = np.empty(0, dtype=np.int64)
+        path_id = np.repeat(np.arange(len(lengths)), lengths)
+        position = np.arange(len(vertex)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        is_last = position == np.repeat(lengths - 1, lengths)
+
+        n_levels = int(np.ceil(np.log2(max(lengths.max(initial=1), 2)))) + 1
+        self.levels = []
+        self._bounds = []
+        for level in range(min(n_levels, max_levels)):
+            kept = np.flatnonzero((position % (2**level) == 0) | is_last)
+            same_path = path_id[kept[:-1]] == path_id[kept[1:]]
+            start = vertex[kept[:-1][same_path]]
+            end = vertex[kept[1:][same_path]]
+            self.levels.append((start, end))
+            self._bounds.append(
+                (np.minimum(xy[start], xy[end]), np.maximum(xy[start], xy[end]))
+            )
+
+    def visible(self, level, x_lim, y_lim):
+        """indices of the segments of a level that overlap the view"""
+        low, high = self._bounds[level]
+        return np.flatnonzero(
+            (high[:, 0] >= x_lim[0])
+            & (low[:, 0] <= x_lim[1])
+            & (high[:, 1] >= y_lim[0])
+            & (low[:, 1] <= y_lim[1])
+        )
+
+    def select(self, x_lim, y_lim, target_segments):
+        """finest level whose visible segments number at most target_segments (or the
+        coarsest level), found by bisection since coarser levels never show more
+
+        Returns:
+            level (int): chosen level
+            visible (np.array): indices of its segments in the view
+        """
+        low, high = 0, len(self.levels) - 1
+        chosen = self.visible(high, x_lim, y_lim)
+        chosen_level = high
+        while low < high:
+            middle = (low + high) // 2
+            visible = self.visible(middle, x_lim, y_lim)
+            if len(visible) <= target_segments:
+                chosen_level, chosen, high = middle, visible, middle
+            else:
+                low = middle + 1
+        return chosen_level, chosen
+
+    def segments(self, level, visible):
+        start, end = self.levels[level]
+        return self.xy[np.stack([start[visible], end[visible]], axis=1)]
+
+
+class LODHandler:
+    """swaps the segments of a LineCollection for the pyramid level matching the view.
+    the collection calls update() when it is drawn, so a zoom that changes both limits
+    is handled once, with the final view. the handler is stored on the collection."""
+
+    def __init__(
+        self,
+        ax,
+        collection,
+        lod,
+        colors=None,
+        values=None,
+        widths=1,
+        target_segments=20000,
+        margin=0.25,
+    ):
+        self.ax = ax
+        self.collection = collection
+        self.lod = lod
+        self.colors = colors
+        self.values = None if values is None else _owned(values)
+        self.widths = widths
+        self.target_segments = target_segments
+        self.margin = margin
+        self.level = None
+        self.connected = True
+        self._state = None
+        collection._lod_handler = self
+
+    def update(self):
+        x_lim = sorted(self.ax.get_xlim())
+        y_lim = sorted(self.ax.get_ylim())
+        # redrawing without zoom or pan needs no new segments
+        state = (tuple(x_lim), tuple(y_lim))
+        if state == self._state:
+            return
+        self._state = state
+
+        # pad the view so small pans stay covered
+        x_pad = (x_lim[1] - x_lim[0]) * self.margin
+        y_pad = (y_lim[1] - y_lim[0]) * self.margin
+        level, visible = self.lod.select(
+            (x_lim[0] - x_pad, x_lim[1] + x_pad),
+            (y_lim[0] - y_pad, y_lim[1] + y_pad),
+            self.target_segments,
+        )
+        self.level = level
+        # per segment styles come from its start vertex, as in plot_verts
+        start = self.lod.levels[level][0][visible]
+        self.collection.set_segments(self.lod.segments(level, visible))
+        if self.values is not None:
+            self.collection.set_array(self.values[start])
+        elif self.colors is not None:
+            self.collection.set_color(self.colors[start])
+        if np.ndim(self.widths):
+            self.collection.set_linewidth(self.widths[start])
+        self.collection.stale = True
+
+    def disconnect(self):
+        """stops updating the collection on zoom and pan, leaving the current level"""
+        self.connected = False
+
+
+class LODCollection(LineCollection):
+    """LineCollection that brings its LODHandler up to date with the view before it is
+    drawn"""
+
+    def draw(self, renderer):
+        handler = getattr(self, "_lod_handler", None)
+        if handler is not None and handler.connected:
+            handler.update()
+        super().draw(renderer)
+
+
+def cached_lod(vertices, edges, key, build):
+    """the SkeletonLOD of a skeleton, built once per vertices array, edges array and key
+    (i.e. the projection and root) and reused by later plots of the same skeleton
+
+    Args:
+        vertices (np.array): vertices of the skeleton. the cache entry lives as long as
+            this array and is rebuilt if it is replaced
+        edges (np.array): edges of the skeleton, held weakly
+        key (hashable): everything else the pyramid depends on
+        build (callable): returns a new SkeletonLOD
+
+    Returns:
+        lod (SkeletonLOD): cached pyramid
+    """
+    # keyed by id, since arrays are not hashable. the entry is dropped with the array
+    with _lod_lock:
+        entry = _lod_cache.get(id(vertices))
+        if entry is None or entry[0]() is not vertices:
+            entry = _lod_cache[id(vertices)] = (weakref.ref(vertices), {})
+            weakref.finalize(vertices, _lod_cache.pop, id(vertices), None)
+        pyramid = entry[1].get(key)
+    if pyramid is None or pyramid[0]() is not edges:
+        pyramid = (weakref.ref(edges), build())
+        with _lod_lock:
+            entry[1][key] = pyramid
+    return pyramid[1]
+
+
+def plot_lod(
+    ax,
+    lod,
+    colors=None,
+    values=None,
+    widths=1,
+    target_segments=20000,
+    cmap=None,
+    norm=None,
+    **kwargs,
+):
+    """adds a skeleton to ax as one LineCollection that re-simplifies on zoom and pan
+
+    Args:
+        ax (matplotlib.axes): axis to plot on
+        lod (SkeletonLOD): pyramid of the skeleton, i.e. from cached_lod
+        colors (np.array, nx4, optional): rgba color of each vertex. Defaults to None.
+        values (np.array, optional): value of each vertex, mapped through cmap and norm
+            instead of colors. Defaults to None.
+        widths (float or np.array, optional): line width of each vertex. Defaults to 1.
+        target_segments (int, optional): about how many segments to draw at any zoom.
+            Defaults to 20000.
+        cmap (str or matplotlib.colors.Colormap, optional): colormap of values.
+        norm (matplotlib.colors.Normalize, optional): normalization of values.
+        **kwargs: passed to LineCollection, i.e. capstyle, joinstyle, alpha
+
+    Returns:
+        collection (LODCollection): the collection, whose _lod_handler attribute holds
+            the LODHandler
+    """
+    if values is not None:
+        kwargs.update(cmap=cmap, norm=norm)
+    collection = LODCollection(
+        np.empty((0, 2, 2)), linewidths=widths if np.ndim(widths) == 0 else 1, **kwargs
+    )
+    ax.add_collection(collection, autolim=False)
+    ax.update_datalim(lod.xy)
+    handler = LODHandler(
+        ax,
+        collection,
+        lod,
+        colors=colors,
+        values=values,
+        widths=widths,
+        target_segments=target_segments,
+    )
+    handler.update()
+    return collection
+
+
+def _owned(array):
+    """array, or a copy of it if it is a view. the levels are kept for the lifetime of
+    the plot, so they must not point into buffers the caller may release, i.e. shared
+    memory segments"""
+    array = np.asarray(array)
+    return array if array.flags.owndata else array.copy()
@@ -0,0 +1,291 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from . import utils
+
+METRICS = ("path_distance", "strahler_order", "branch_order", "hops")
+
+_metrics_cache = utils.VertexCache()
+
+
+def parent_array(edges, n_vertices):
+    """parent of every vertex from rooted (child, parent) edges, -1 for the root
+
+    Args:
+        edges (np.array, nx2): edges oriented child->parent, as in a rooted meshparty skeleton
+        n_vertices (int): number of vertices
+
+    Returns:
+        parent (np.array): index of the parent of each vertex, -1 for roots
+    """
+    edges = np.asarray(edges)
+    parent = np.full(n_vertices, -1, dtype=np.int64)
+    parent[edges[:, 0]] = edges[:, 1]
+    return parent
+
+
+def accumulate_to_root(parent, weights):
+    """sum of weights over each vertex and all its ancestors, by pointer jumping: every
+    pass adds the running sum of the current ancestor and jumps to that ancestor's
+    ancestor, so the loop runs log2(depth) vectorized passes instead of one per level
+
+    Args:
+        parent (np.array): parent of each vertex, -1 for roots
+        weights (np.array): value of each vertex
+
+    Returns:
+        totals (np.array): summed weights from each vertex up to its root
+    """
+    totals = np.array(weights, dtype=float)
+    ancestor = np.array(parent, dtype=np.int64)
+    active = np.flatnonzero(ancestor >= 0)
+    for _ in range(_max_passes(len(parent))):
+        if len(active) == 0:
+            return totals
+        # the right hand sides are gathered before assigning, so every vertex reads
+        # the sums and ancestors of the previous pass
+        totals[active] += totals[ancestor[active]]
+        ancestor[active] = ancestor[ancestor[active]]
+        active = active[ancestor[active] >= 0]
+    raise ValueError("parent array has a cycle")
+
+
+def path_distance(vertices, parent):
+    """path length along the skeleton from each vertex to the root (soma)"""
+    vertices = np.asarray(vertices)
+    if not np.issubdtype(vertices.dtype, np.floating):
+        vertices = vertices.astype(float)
+    has_parent = parent >= 0
+    lengths = np.zeros(len(parent))
+    lengths[has_parent] = np.linalg.norm(
+        vertices[has_parent] - vertices[parent[has_parent]], axis=1
+    )
+    return accumulate_to_root(parent, lengths)
+
+
+def hops(parent):
+    """number of edges between each vertex and the root"""
+    return accumulate_to_root(parent, parent >= 0).astype(int)
+
+
+def branch_order(parent):
+    """number of branch points between each vertex and the root. vertices between the
+    root and the first branch point have order 0, their children 1 and so on"""
+    n_children = _n_children(parent)
+    below_branch = np.zeros(len(parent))
+    has_parent = parent >= 0
+    below_branch[has_parent] = n_children[parent[has_parent]] > 1
+    return accumulate_to_root(parent, below_branch).astype(int)
+
+
+def strahler_order(parent, orders=None):
+    """strahler order of every vertex: 1 at the tips, and at each branch point the
+    largest order of its children, plus one if two or more children share it.
+
+    an unbranched run of vertices takes the order of the branch point or tip below it,
+    so the bottom up sweep only visits branch points, one vectorized step per branch order.
+
+    Args:
+        parent (np.array): parent of each vertex, -1 for roots
+        orders (np.array, optional): branch_order(parent), if already computed.
+
+    Returns:
+        strahler (np.array): strahler order of each vertex
+    """
+    n = len(parent)
+    n_children = _n_children(parent)
+    if orders is None:
+        orders = branch_order(parent)
+    below = _nearest_key_below(parent, n_children)
+
+    strahler = np.ones(n, dtype=int)
+    for children, branch_points in _branch_levels(parent, n_children, orders):
+        child_order = strahler[below[children]]
+        highest = np.zeros(n, dtype=int)
+        np.maximum.at(highest, branch_points, child_order)
+        n_highest = np.zeros(n, dtype=int)
+        np.add.at(n_highest, branch_points, child_order == highest[branch_points])
+        branch_points = np.unique(branch_points)
+        strahler[branch_points] = highest[branch_points] + (n_highest[branch_points] > 1)
+    return strahler[below]
+
+
+def rooted_parent_array(edges, n_vertices, root=0):
+    """parent of every vertex from edges in any orientation, rooted at root by a
+    breadth first search. vertices not connected to root are rooted at their lowest index.
+
+    Args:
+        edges (np.array, nx2): undirected edges between vertices
+        n_vertices (int): number of vertices
+        root (int, optional): root vertex, i.e. the soma. Defaults to 0.
+
+    Returns:
+        parent (np.array): index of the parent of each vertex, -1 for roots
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    graph = sparse.csr_matrix(
+        (np.ones(len(edges), dtype=bool), (edges[:, 0], edges[:, 1])),
+        shape=(n_vertices, n_vertices),
+    )
+    _, labels = csgraph.connected_components(graph, directed=False)
+    _, first = np.unique(labels, return_index=True)
+    roots = [root] + [r for r in first if labels[r] != labels[root]]
+
+    parent = np.full(n_vertices, -1, dtype=np.int64)
+    for r in roots:
+        order, predecessors = csgraph.breadth_first_order(
+            graph, r, directed=False, return_predecessors=True
+        )
+        parent[order[1:]] = predecessors[order[1:]]
+    return parent
+
+
+def cover_paths(vertices, parent):
+    """the paths of meshparty's Skeleton.cover_paths_with_parent from a parent array:
+    from the tip farthest from the root down to the root, then from every other tip, in
+    order of decreasing distance, until the path reaches a vertex already covered, which
+    is appended as the path's last vertex.
+
+    a vertex lies on the path of the farthest tip below it. that tip is found for the
+    branch points only, one vectorized step per branch order as in strahler_order.
+
+    Args:
+        vertices (np.array, nx3): skeleton vertices
+        parent (np.array): parent of each vertex, -1 for roots
+
+    Returns:
+        paths (list): arrays of vertex indices, each ordered from its tip to the root
+    """
+    n = len(parent)
+    if n == 0:
+        return []
+    n_children = _n_children(parent)
+    below = _nearest_key_below(parent, n_children)
+    distance = path_distance(vertices, parent)
+
+    # farthest tip below every tip and branch point
+    farthest = np.arange(n)
+    for children, branch_points in _branch_levels(parent, n_children, branch_order(parent)):
+        candidates = farthest[below[children]]
+        best = np.full(n, -np.inf)
+        np.maximum.at(best, branch_points, distance[candidates])
+        wins = distance[candidates] == best[branch_points]
+        won, first = np.unique(branch_points[wins], return_index=True)
+        farthest[won] = candidates[wins][first]
+    tip = farthest[below]
+
+    tips = np.flatnonzero(n_children == 0)
+    tips = tips[np.argsort(-distance[tips], kind="stable")]
+    rank = np.empty(n, dtype=np.int64)
+    rank[tips] = np.arange(len(tips))
+    # group the vertices by path, deepest first within a path
+    order = np.lexsort((-hops(parent), rank[tip]))
+    bounds = np.cumsum(np.bincount(rank[tip], minlength=len(tips)))[:-1]
+    paths = []
+    for path in np.split(order, bounds):
+        if parent[path[-1]] >= 0:
+            path = np.append(path, parent[path[-1]])
+        paths.append(path)
+    return paths
+
+
+def _nearest_key_below(parent, n_children):
+    """the nearest tip or branch point at or below every vertex. vertices with one child
+    point to it and jump down until they reach a vertex that is not a single child chain"""
+    n = len(parent)
+    has_parent = parent >= 0
+    below = np.arange(n)
+    single = n_children == 1
+    only_child = np.flatnonzero(has_parent & single[np.where(has_parent, parent, 0)])
+    below[parent[only_child]] = only_child
+    active = np.flatnonzero(single)
+    for _ in range(_max_passes(n)):
+        if len(active) == 0:
+            return below
+        below[active] = below[below[active]]
+        active = active[single[below[active]]]
+    raise ValueError("parent array has a cycle")
+
+
+def _branch_levels(parent, n_children, orders):
+    """(children, branch points) of every branch, one pair of arrays per branch order
+    from the deepest branch points up. all children of a branch point share its level,
+    so a bottom up sweep over the levels sees final values below each branch point"""
+    has_parent = parent >= 0
+    children = np.flatnonzero(has_parent & (n_children[np.where(has_parent, parent, 0)] > 1))
+    branch_points = parent[children]
+    sort = np.argsort(-orders[branch_points], kind="stable")
+    children, branch_points = children[sort], branch_points[sort]
+    levels = orders[branch_points]
+    starts = np.flatnonzero(np.r_[True, levels[1:] != levels[:-1]])
+    for start, stop in zip(starts, np.r_[starts[1:], len(levels)]):
+        yield children[start:stop], branch_points[start:stop]
+
+
+def _n_children(parent):
+    return np.bincount(parent[parent >= 0], minlength=len(parent))
+
+
+def _max_passes(n):
+    # pointer jumping halves the remaining depth each pass
+    return int(np.ceil(np.log2(max(n, 2)))) + 1
+
+
+class Morphometrics:
+    """per vertex morphometrics of a skeleton, each computed once on first access
+
+    Args:
+        vertices (np.array, nx3): skeleton vertices
+        edges (np.array, nx2): rooted (child, parent) edges, as in a meshparty skeleton
+    """
+
+    def __init__(self, vertices, edges):
+        self.vertices = np.asarray(vertices)
+        self.parent = parent_array(edges, len(self.vertices))
+        self._values = {}
+
+    @property
+    def path_distance(self):
+        if "path_distance" not in self._values:
+            self._values["path_distance"] = path_distance(self.vertices, self.parent)
+        return self._values["path_distance"]
+
+    @property
+    def branch_order(self):
+        if "branch_order" not in self._values:
+            self._values["branch_order"] = branch_order(self.parent)
+        return self._values["branch_order"]
+
+    @property
+    def strahler_order(self):
+        if "strahler_order" not in self._values:
+            self._values["strahler_order"] = strahler_order(
+                self.parent, orders=self.branch_order
+            )
+        return self._values["strahler_order"]
+
+    @property
+    def hops(self):
+        if "hops" not in self._values:
+            self._values["hops"] = hops(self.parent)
+        return self._values["hops"]
+
+    def __getitem__(self, metric):
+        if metric not in METRICS:
+            raise KeyError(f"unknown metric '{metric}', expected one of {METRICS}")
+        return getattr(self, metric)
+
+
+def morphometrics(sk):
+    """returns the Morphometrics of a skeleton, cached per skeleton object and rebuilt
+    if the skeleton vertices change"""
+    return _metrics_cache.get(
+        sk, sk.vertices, lambda: Morphometrics(sk.vertices, sk.edges)
+    )
+
+
+def vertex_metric(sk, metric):
+    """one of METRICS for every vertex of a skeleton, i.e.
+    vertex_metric(sk, 'strahler_order')"""
+    return morphometrics(sk)[metric]
@@ -0,0 +1,266 @@
+import contextlib
+import os
+import tempfile
+
+import h5py
+import numpy as np
+from meshparty.meshwork import meshwork_io
+from scipy import spatial
+
+from . import utils
+
+
+class MeshworkSkeleton:
+    """skeleton-only stand in for a meshparty Meshwork, as read by read_mw_skeleton.
+    holds the skeleton, the mesh to skeleton mapping and the requested anno tables
+    but never the mesh vertices or faces. plot_mw_skel, utils.pull_mw_rad and
+    utils.pull_mw_skel_colors accept it in place of a Meshwork.
+
+    Attributes:
+        skeleton (meshparty.skeleton.Skeleton): the meshwork skeleton, masked like Meshwork.skeleton
+        anno (AnnotationTables): the loaded anno tables, by name or attribute
+        skeleton_indices (SkeletonIndices): skeleton vertex indices, with to_mesh_region_point
+        seg_id (int): segment id stored in the file
+        voxel_resolution (np.array): voxel resolution of the anno point columns
+    """
+
+    def __init__(self, skeleton, anno, mesh_to_skel_map, mesh_mask, seg_id, voxel_resolution):
+        self.skeleton = skeleton
+        self.anno = anno
+        self.seg_id = seg_id
+        self.voxel_resolution = voxel_resolution
+        self._mesh_to_skel_map = mesh_to_skel_map
+        self._mesh_mask = mesh_mask
+        self._skeleton_indices = None
+
+    @property
+    def skeleton_indices(self):
+        if self._skeleton_indices is None:
+            self._skeleton_indices = self._compute_skeleton_indices()
+        return self._skeleton_indices
+
+    def _compute_skeleton_indices(self):
+        # first (masked) mesh vertex of every skeleton vertex, as Meshwork computes it
+        skinds = self.skeleton.filter_unmasked_indices_padded(
+            self._mesh_to_skel_map[self._mesh_mask]
+        )
+        valid = skinds >= 0
+        nodes, first = np.unique(skinds[valid], return_index=True)
+        region_point = np.full(self.skeleton.n_vertices, -1)
+        region_point[nodes] = np.flatnonzero(valid)[first]
+        return SkeletonIndices(np.arange(self.skeleton.n_vertices), region_point)
+
+
+class SkeletonIndices(np.ndarray):
+    """skeleton vertex indices that know their mesh region point"""
+
+    def __new__(cls, indices, region_point):
+        obj = np.asarray(indices).view(cls)
+        obj._region_point = region_point
+        return obj
+
+    def __array_finalize__(self, obj):
+        self._region_point = getattr(obj, "_region_point", None)
+
+    @property
+    def to_mesh_region_point(self):
+        return self._region_point[np.asarray(self)]
+
+
+class AnnotationTables:
+    """anno tables of a MeshworkSkeleton, accessed like Meshwork.anno"""
+
+    def __init__(self, tables):
+        self._tables = tables
+
+    @property
+    def table_names(self):
+        return list(self._tables.keys())
+
+    def __getitem__(self, name):
+        return self._tables[name]
+
+    def __contains__(self, name):
+        return name in self._tables
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_tables"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class SkeletonAnnotation:
+    """an anno table mapped onto the skeleton without the mesh. skel_index is, as in
+    Meshwork, the sorted unique skeleton vertices of the rows, not one index per row.
+
+    tables anchored by a mesh index column map exactly as in Meshwork. tables anchored
+    by a point column are snapped to the nearest skeleton vertex instead of the nearest
+    mesh vertex, since the mesh is never loaded. their skel_index can then differ from
+    Meshwork's where the nearest mesh vertex maps to another skeleton vertex, and their
+    mesh_index_filt column holds the region point of that skeleton vertex rather than
+    the nearest mesh vertex.
+    """
+
+    def __init__(self, name, data, anchored, point_column, index_column, max_distance):
+        self.name = name
+        self.anchored = anchored
+        self.point_column = point_column
+        self._data = data
+        self._max_distance = np.inf if max_distance is None else max_distance
+        self._index_column = index_column
+        self._index_column_filt = (
+            f"{index_column}_filt" if index_column is not None else "mesh_index_filt"
+        )
+        self._skel_index_padded = None
+        self._df = data
+
+    def _anchor(self, mw, mesh_node_mask):
+        """maps the table onto the skeleton of mw"""
+        if not self.anchored:
+            return
+        mesh_mask = mw._mesh_mask
+        filt_map = np.cumsum(mesh_mask) - 1
+        if self._index_column is not None:
+            base = np.flatnonzero(mesh_node_mask)[self._data[self._index_column].values]
+            keep = mesh_mask[base]
+            skel_base = mw._mesh_to_skel_map[base[keep]]
+            skel_index = mw.skeleton.filter_unmasked_indices_padded(skel_base)
+            mesh_filt = filt_map[base[keep]]
+        else:
+            # snap to the unmasked skeleton, so points whose region is masked out are
+            # dropped like points anchored to masked mesh vertices
+            sk = mw.skeleton
+            points = np.vstack(self._data[self.point_column].values) * mw.voxel_resolution
+            dist, base = spatial.cKDTree(sk._rooted.vertices).query(points, workers=-1)
+            keep = (dist < self._max_distance) & sk.node_mask[base]
+            skel_index = sk.filter_unmasked_indices_padded(base[keep])
+            mesh_filt = mw.skeleton_indices.to_mesh_region_point[skel_index]
+        df = self._data[keep].copy()
+        df[self._index_column_filt] = mesh_filt
+        self._df = df
+        self._skel_index_padded = skel_index
+
+    @property
+    def df(self):
+        return self._df
+
+    @property
+    def skel_index(self):
+        if self._skel_index_padded is None:
+            return None
+        return np.unique(self._skel_index_padded[self._skel_index_padded >= 0])
+
+    @property
+    def voxels(self):
+        if self.point_column is None or len(self.df) == 0:
+            return np.zeros((0, 3))
+        return np.vstack(self.df[self.point_column].values)
+
+    def __getitem__(self, key):
+        return self.df.__getitem__(key)
+
+    def __len__(self):
+        return len(self.df)
+
+    def __repr__(self):
+        return self.df.__repr__()
+
+
+def read_mw_skeleton(source, anno_tables=None, dtype=None):
+    """reads only the skeleton, mesh to skeleton mapping and anno tables of a meshwork
+    .h5 file. the mesh vertices and faces, which are most of the file, are never read.
+
+    Args:
+        source (str or file-like): local path of the .h5 file or a bytes buffer of it
+        anno_tables (list, optional): names of the anno tables to read. tables not in
+            the file are skipped. Defaults to None, which reads every table.
+        dtype (np.dtype, optional): dtype of the skeleton vertices, i.e. np.float32.
+            Defaults to None (as stored).
+
+    Returns:
+        mw (MeshworkSkeleton): skeleton-only meshwork
+    """
+    with h5py.File(source, "r") as f:
+        version = f.attrs.get("version", meshwork_io.NULL_VERSION)
+        seg_id = f.attrs.get("seg_id", None)
+        voxel_resolution = np.array(
+            f.attrs.get("voxel_resolution", [4, 4, 40]), dtype=float
+        ).reshape(1, 3)
+        if "skeleton" not in f:
+            raise ValueError("meshwork file has no skeleton")
+
+        # small boolean/int arrays, read instead of the mesh vertices and faces
+        mesh_to_skel_map = f["skeleton/mesh_to_skel_map"][()]
+        if "mesh" in f and "node_mask" in f["mesh"]:
+            mesh_node_mask = f["mesh/node_mask"][()]
+            mesh_mask = f["mesh/mesh_mask"][()] & mesh_node_mask
+            voxel_scaling = f["mesh"].attrs.get("voxel_scaling", None)
+            if voxel_scaling is not None:
+                voxel_resolution = voxel_resolution * voxel_scaling
+        else:
+            mesh_node_mask = np.full(len(mesh_to_skel_map), True)
+            mesh_mask = mesh_node_mask
+
+        table_attrs = {}
+        if "annotations" in f:
+            for name in f["annotations"].keys():
+                if anno_tables is not None and name not in anno_tables:
+                    continue
+                attrs = f[f"annotations/{name}"].attrs
+                table_attrs[name] = {
+                    "anchored": bool(attrs.get("anchor_to_mesh")),
+                    "point_column": attrs.get("point_column", None),
+                    "max_distance": attrs.get("max_distance", None),
+                    "index_column": attrs.get("index_column", None)
+                    if bool(attrs.get("defined_index", False))
+                    else None,
+                }
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    sk = meshwork_io.load_meshwork_skeleton(source, version=version)
+    if dtype is not None:
+        utils.cast_skeleton_vertices(sk, dtype)
+    if not np.all(mesh_mask):
+        skel_mask = np.full(sk.unmasked_size, False)
+        skel_mask[np.unique(mesh_to_skel_map[mesh_mask])] = True
+        sk.apply_mask(skel_mask, in_place=True)
+
+    tables = {}
+    with _table_source(source, version, copy=len(table_attrs) > 0) as table_source:
+        for name, attrs in table_attrs.items():
+            tables[name] = SkeletonAnnotation(
+                name, _load_table(table_source, name, version), **attrs
+            )
+
+    mw = MeshworkSkeleton(
+        sk,
+        AnnotationTables(tables),
+        mesh_to_skel_map,
+        mesh_mask,
+        seg_id,
+        voxel_resolution,
+    )
+    for table in tables.values():
+        table._anchor(mw, mesh_node_mask)
+    return mw
+
+
+@contextlib.contextmanager
+def _table_source(source, version, copy=True):
+    """yields a source the anno tables can be read from. pandas reads version 1 (hdf)
+    tables from paths only, so a buffer is copied to a temporary file once per read."""
+    if not copy or version != 1 or isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+    with tempfile.NamedTemporaryFile(suffix=".h5") as tmp:
+        tmp.write(source.getbuffer())
+        tmp.flush()
+        yield tmp.name
+
+
+def _load_table(source, name, version):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return meshwork_io.anno_load_function[version](source, name)
@@ -1,10 +1,16 @@
+import collections
+import copy
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+from matplotlib import colors as mcolors
 from matplotlib.collections import LineCollection
 from meshparty import meshwork, skeleton
 
-from . import utils
+from . import lod, morphometrics, skel_io, spatial, utils
 
 axis_dict = {"x": 0, "y": 1, "z": 2}
 
@@ -30,6 +36,12 @@ def plot_verts(
     capstyle="round",
     joinstyle="round",
     ax=None,
+    dtype=None,
+    offset=None,
+    cmap=None,
+    norm=None,
+    interactive=False,
+    lod_segments=20000,
 ):
     """plots skeleton vertices and edges with various options
 
@@ -66,68 +78,123 @@ def plot_verts(
             Defaults to 'round'.
         ax (matplotlib.axes._subplots.AxesSubplot, optional): axis on which to plot the skeleton.
             If none is given, will find current axis with plt.gca()
+        dtype (np.dtype, optional): dtype of the plotted geometry. np.float32 halves the
+            projected vertices and the segments built from them, but matplotlib stores
+            the LineCollection's segments as float64, so the saving in a full plot is
+            small; it mostly pays off when vertices are read as float32 too
+            (see skel_io.read_skeleton). Defaults to None, which keeps the dtype of vertices.
+        offset (tuple, optional): (x, y) offset added to the vertices in plot coordinates.
+            Defaults to None.
+        cmap (str or matplotlib.colors.Colormap, optional): if given, skel_colors are
+            continuous values (i.e. a morphometrics metric) mapped through cmap instead of
+            labels looked up in skel_color_map. Defaults to None.
+        norm (matplotlib.colors.Normalize, optional): maps skel_colors to [0, 1] for cmap.
+            Defaults to None, which spans the range of skel_colors.
+        interactive (bool, optional): draw the skeleton as one collection that swaps in a
+            simplified level (see lod.SkeletonLOD) matching the view whenever the axes
+            limits change, so zooming and panning stay fast. Defaults to False.
+        lod_segments (int, optional): about how many segments to draw at any zoom when
+            interactive. Defaults to 20000.
 
     """
 
     if ax is None:
         ax = plt.gca()
 
-    sk = skeleton.Skeleton(
-        vertices,
-        edges,
-        vertex_properties={
-            "radius": pd.Series(radius),
-            "compartment": pd.Series(skel_colors),
-        },
-        root=soma_node,
-        remove_zero_length_edges=False,
-    )
+    vertices = np.asarray(vertices)
+    edges = np.asarray(edges)
+    n = len(vertices)
 
-    if skel_colors is not None:
-        skel_colors = utils.ensure_length(skel_colors, len(vertices))
-    if radius is not None:
-        radius = utils.ensure_length(radius, len(vertices), feature_name="radius")
+    def cover_paths():
+        # straight from the parent array, without building a meshparty Skeleton
+        parent = morphometrics.rooted_parent_array(edges, n, root=soma_node)
+        return morphometrics.cover_paths(vertices, parent)
 
-    x, y = axis_dict[x], axis_dict[y]
+    continuous = cmap is not None and skel_colors is not None
+    colors = values = None
+    if continuous:
+        values = np.broadcast_to(
+            np.asarray(utils.ensure_length(skel_colors, n), dtype=float), n
+        )
+        # autoscaling sets the limits in place, so scale a copy of the caller's norm
+        norm = mcolors.Normalize() if norm is None else copy.copy(norm)
+        if not norm.scaled():
+            norm.autoscale_None(values)
+    elif skel_colors is None:
+        colors = np.broadcast_to(mcolors.to_rgba(color), (n, 4))
+    else:
+        labels, inverse = np.unique(
+            np.broadcast_to(np.asarray(utils.ensure_length(skel_colors, n)), n),
+            return_inverse=True,
+        )
+        colors = mcolors.to_rgba_array([skel_color_map[x] for x in labels])[
+            inverse.ravel()
+        ]
+    if radius is None:
+        widths = line_width
+    else:
+        radius = utils.ensure_length(radius, n, feature_name="radius")
+        widths = np.broadcast_to(np.asarray(radius, dtype=float), n) * line_width
 
-    for cover_path in sk.cover_paths_with_parent():
-        if skel_colors is None:
-            colors = [color] * len(cover_path)
-        else:
-            colors = [
-                skel_color_map[x]
-                for x in sk.vertex_properties["compartment"][cover_path].values
-            ]
-        if radius is None:
-            linewidths = pd.Series([line_width] * len(cover_path))
+    x, y = axis_dict[x], axis_dict[y]
+    # project, cast and offset once; segments are gathered from this array
+    xy = utils.project_verts(vertices, x=x, y=y, dtype=dtype, offset=offset)
+
+    if interactive:
+        # the pyramid is reused by later interactive plots of the same skeleton
+        key = (
+            x,
+            y,
+            None if dtype is None else np.dtype(dtype).str,
+            None if offset is None else tuple(np.asarray(offset, dtype=float)),
+            int(soma_node),
+        )
+        skeleton_lod = lod.cached_lod(
+            vertices, edges, key, lambda: lod.SkeletonLOD(xy, cover_paths())
+        )
+        lod.plot_lod(
+            ax,
+            skeleton_lod,
+            colors=colors,
+            values=values,
+            widths=widths,
+            target_segments=lod_segments,
+            cmap=cmap,
+            norm=norm,
+            capstyle=capstyle,
+            joinstyle=joinstyle,
+            alpha=skel_alpha,
+        )
+    else:
+        # one collection for the whole skeleton. styles of each segment come from its
+        # start vertex
+        segments, start = utils.cover_path_segments(xy, cover_paths())
+        if continuous:
+            color_kwargs = dict(array=values[start], cmap=cmap, norm=norm)
         else:
-            linewidths = (sk.vertex_properties["radius"][cover_path]) * line_width
-
-        path_verts = sk.vertices[cover_path][:, [x, y]]
-
-        segments = np.concatenate(
-            [path_verts[:-1], path_verts[0:-1], path_verts[1:]], axis=1
-        ).reshape(len(path_verts) - 1, 3, 2)
+            color_kwargs = dict(color=colors[start])
         lc = LineCollection(
             segments,
-            linewidths=linewidths,
-            color=colors,
+            linewidths=widths[start] if np.ndim(widths) else widths,
             capstyle=capstyle,
             joinstyle=joinstyle,
             alpha=skel_alpha,
+            **color_kwargs,
         )
         ax.add_collection(lc)
 
     ax.set_aspect("equal")
 
     if plot_soma:
-        if skel_colors is not None:
+        if continuous:
+            soma_color = [plt.get_cmap(cmap)(norm(values[soma_node]))]
+        elif skel_colors is not None:
             soma_color = skel_color_map[1]
         else:
             soma_color = color
         ax.scatter(
-            sk.root_position[x],
-            sk.root_position[y],
+            xy[soma_node, 0],
+            xy[soma_node, 1],
             s=soma_size,
             c=soma_color,
             zorder=2,
@@ -135,12 +202,12 @@ def plot_verts(
 
     utils.set_xy_lims(
         ax,
-        verts=sk.vertices,
+        verts=xy,
         invert_y=invert_y,
         x_min_max=x_min_max,
         y_min_max=y_min_max,
-        x=x,
-        y=y,
+        x=0,
+        y=1,
     )
 
     ax.set_title(title)
@@ -168,6 +235,15 @@ def plot_skel(
     capstyle="round",
     joinstyle="round",
     ax=None,
+    dtype=None,
+    offset=None,
+    color_by=None,
+    width_by=None,
+    width_range=(0.5, 4),
+    cmap=None,
+    norm=None,
+    interactive=False,
+    lod_segments=20000,
 ):
     """plots a skeleton object. attempts to pull out arguments from skeleton and plot with plot_verts
 
@@ -201,6 +277,27 @@ def plot_skel(
             Defaults to 'round'.
         ax (matplotlib.axes, optional): axis on which to plot the skeleton
             If none is given, will find current axis with plt.gca()
+        dtype (np.dtype, optional): dtype of the plotted geometry, i.e. np.float32.
+            Defaults to None, which keeps the dtype of sk.vertices.
+        offset (tuple, optional): (x, y) offset added to the vertices in plot coordinates.
+            Defaults to None.
+        color_by (str or iterable, optional): continuous color source. one of
+            morphometrics.METRICS ('path_distance', 'strahler_order', 'branch_order', 'hops')
+            or a value per vertex, mapped through cmap. Overwrites skel_colors.
+            Defaults to None.
+        width_by (str or iterable, optional): width source, a metric name or a value per
+            vertex like color_by. values are scaled linearly onto width_range (times
+            line_width). Overwrites radius. Defaults to None.
+        width_range (tuple, optional): line widths of the smallest and largest width_by
+            values. Defaults to (0.5, 4).
+        cmap (str or matplotlib.colors.Colormap, optional): colormap of color_by.
+            Defaults to None, which is 'viridis' when color_by is given.
+        norm (matplotlib.colors.Normalize, optional): maps color_by values to [0, 1].
+            Defaults to None, which spans the range of the values.
+        interactive (bool, optional): re-simplify the skeleton to the current view on
+            every zoom and pan, see plot_verts. Defaults to False.
+        lod_segments (int, optional): about how many segments to draw at any zoom when
+            interactive. Defaults to 20000.
     """
     if ax is None:
         ax = plt.gca()
@@ -211,6 +308,19 @@ def plot_skel(
 
     if pull_radius:
         radius = sk.vertex_properties["radius"]
+
+    if color_by is not None:
+        skel_colors = _vertex_values(sk, color_by)
+        if cmap is None:
+            cmap = "viridis"
+    if width_by is not None:
+        widths = _vertex_values(sk, width_by).astype(float)
+        low, high = widths.min(), widths.max()
+        if high > low:
+            widths = (widths - low) / (high - low)
+        else:
+            widths = np.ones_like(widths)
+        radius = width_range[0] + widths * (width_range[1] - width_range[0])
     # make sure right shape
     assert radius is None or len(radius) == len(
         sk.vertices
@@ -240,9 +350,22 @@ def plot_skel(
         y_min_max=y_min_max,
         capstyle=capstyle,
         joinstyle=joinstyle,
+        dtype=dtype,
+        offset=offset,
+        cmap=cmap,
+        norm=norm,
+        interactive=interactive,
+        lod_segments=lod_segments,
     )
 
 
+def _vertex_values(sk, source):
+    """per vertex values of a skeleton from a morphometrics metric name or an array"""
+    if isinstance(source, str):
+        return morphometrics.vertex_metric(sk, source)
+    return np.asarray(utils.ensure_length(np.asarray(source), len(sk.vertices)))
+
+
 def plot_mw_skel(
     mw: meshwork,
     plot_presyn=False,
@@ -280,6 +403,11 @@ def plot_mw_skel(
     pre_anno={"pre_syn": "pre_pt_position"},
     post_anno={"post_syn": "post_pt_position"},
     ax=None,
+    dtype=None,
+    color_syn_by_compartment=False,
+    syn_skel_mask=None,
+    interactive=False,
+    lod_segments=20000,
 ):
     """
     Plots a meshwork skeleton with optional synapse markers, compartment labels, radius plotting.
@@ -321,6 +449,13 @@ def plot_mw_skel(
     - pre_anno (dict): Dictionary of presynaptic annotation table and column names.
     - post_anno (dict): Dictionary of postsynaptic annotation table and column names.
     - ax (matplotlib.axes.Axes): Axes object to plot on.
+    - dtype (np.dtype): dtype of the plotted geometry, i.e. np.float32. None keeps the skeleton dtype.
+    - color_syn_by_compartment (bool): Whether to color each synapse by the compartment (skel_colors mapped
+        through skel_color_map) of the skeleton node it snaps to. needs skel_colors or pull_compartment_colors.
+    - syn_skel_mask (array): boolean per skeleton vertex. only synapses that snap to a True node are plotted,
+        i.e. to keep the synapses on one branch.
+    - interactive (bool): Whether to re-simplify the skeleton to the current view on every zoom and pan.
+    - lod_segments (int): About how many skeleton segments to draw at any zoom when interactive.
 
     Returns:
     - None
@@ -346,15 +481,28 @@ def plot_mw_skel(
 
     # add synapses
 
+    if (color_syn_by_compartment or syn_skel_mask is not None) and (
+        plot_presyn or plot_postsyn
+    ):
+        if color_syn_by_compartment and skel_colors is None:
+            raise ValueError(
+                "color_syn_by_compartment needs skel_colors or pull_compartment_colors"
+            )
+        snap = True
+    else:
+        snap = False
+
     if plot_presyn:
-        pre_anno_table = list(pre_anno.keys())[0]
-        pre_column = list(pre_anno.values())[0]
-        presyn_verts = (
-            np.array(
-                [np.array(x) for x in (mw.anno[pre_anno_table][pre_column]).values]
+        presyn_verts = _mw_syn_verts(mw, pre_anno, syn_res)
+        if snap:
+            presyn_verts, presyn_color = _snap_synapses(
+                sk,
+                presyn_verts,
+                presyn_color,
+                skel_colors if color_syn_by_compartment else None,
+                skel_color_map,
+                syn_skel_mask,
             )
-            * syn_res
-        )
         plot_synapses(
             presyn_verts=presyn_verts,
             x=x,
@@ -369,14 +517,16 @@ def plot_mw_skel(
         )
 
     if plot_postsyn:
-        post_anno_table = list(post_anno.keys())[0]
-        post_column = list(post_anno.values())[0]
-        postsyn_verts = (
-            np.array(
-                [np.array(x) for x in (mw.anno[post_anno_table][post_column]).values]
+        postsyn_verts = _mw_syn_verts(mw, post_anno, syn_res)
+        if snap:
+            postsyn_verts, postsyn_color = _snap_synapses(
+                sk,
+                postsyn_verts,
+                postsyn_color,
+                skel_colors if color_syn_by_compartment else None,
+                skel_color_map,
+                syn_skel_mask,
             )
-            * syn_res
-        )
         plot_synapses(
             postsyn_verts=postsyn_verts,
             x=x,
@@ -412,9 +562,39 @@ def plot_mw_skel(
         y_min_max=y_min_max,
         capstyle=capstyle,
         joinstyle=joinstyle,
+        dtype=dtype,
+        interactive=interactive,
+        lod_segments=lod_segments,
     )
 
 
+def _mw_syn_verts(mw, anno, syn_res):
+    """stacks the synapse positions of an anno table ({table: column}) into an nx3 array"""
+    table, column = list(anno.items())[0]
+    positions = mw.anno[table][column].values
+    if len(positions) == 0:
+        return np.empty((0, 3))
+    return np.vstack(positions) * syn_res
+
+
+def _snap_synapses(sk, syn_verts, syn_color, skel_colors, skel_color_map, skel_mask):
+    """snaps synapses to their nearest skeleton node, then drops the ones on nodes outside
+    skel_mask and/or colors them by the compartment of their node"""
+    nodes, _ = spatial.snap_to_skeleton(sk, syn_verts)
+    if skel_mask is not None:
+        skel_mask = np.asarray(skel_mask, dtype=bool)
+        if skel_mask.shape != (len(sk.vertices),):
+            raise ValueError(
+                f"Length of syn_skel_mask ({len(skel_mask.reshape(-1))}) does not match number of skeleton vertices ({len(sk.vertices)})"
+            )
+        keep = skel_mask[nodes]
+        syn_verts = syn_verts[keep]
+        nodes = nodes[keep]
+    if skel_colors is not None:
+        syn_color = [skel_color_map[c] for c in np.asarray(skel_colors)[nodes]]
+    return syn_verts, syn_color
+
+
 def plot_synapses(
     presyn_verts=None,
     postsyn_verts=None,
@@ -533,22 +713,22 @@ def plot_layer_poly(layer_poly_json, ax=None, res=0.3603, size=1, invert_y=True)
     If you do not pass a soma id, it will plot the average layer bounds file. otherwise pass
     soma id to plot the neuron and the custom layer bounds for that neuron.
 
+    to draw the layers as polygons or label vertices by layer, see layers.LayerGeometry.
+
     """
     if ax is None:
         ax = plt.gca()
 
-    verts = np.empty((0, 2))
+    bounds = []
     for key in layer_poly_json.keys():
         if key == "layer_polygons":
-            for layer in layer_poly_json[key]:
-                bound = np.array(layer["path"])
-                verts = np.vstack([verts, bound])
-                ax.scatter(bound[:, 0] * res, bound[:, 1] * res, s=size)
-
+            bounds.extend(np.array(layer["path"]) for layer in layer_poly_json[key])
         else:
-            bound = np.array(layer_poly_json[key]["path"])
-            verts = np.vstack([verts, bound])
+            bounds.append(np.array(layer_poly_json[key]["path"]))
+
+    for bound in bounds:
         ax.scatter(bound[:, 0] * res, bound[:, 1] * res, s=size)
+    verts = np.vstack(bounds) if len(bounds) > 0 else np.empty((0, 2))
     utils.set_xy_lims(ax=ax, verts=verts * res, x="x", y="y", invert_y=invert_y)
 
 
@@ -587,11 +767,21 @@ def plot_skeleton_lineup(
         "layer 6b",
         "white matter",
     ],
+    dtype=None,
+    prefetch=0,
+    radius_anno="segment_properties",
+    basal_anno="basal_mesh_labels",
+    apical_anno="apical_mesh_labels",
+    axon_anno="is_axon",
 ):
     """
-    plots multiple skeletons one after the other on the same plot with optional depth lines
+    plots multiple skeletons one after the other on the same plot with optional depth lines.
+    skel_list is consumed lazily: each skeleton is loaded, plotted at its offset and released
+    before the next, so only the plotted 2d geometry is kept, not every skeleton object.
 
-    skel_list (list): list of meshparty.skeleton.Skeleton objects
+    skel_list (iterable): meshparty.skeleton.Skeleton objects, meshworks (their skeleton is
+        plotted), or files to read with skel_io.read_any (.h5 files are read skeleton only),
+        given as a path or a (directory, filename) tuple. can be a generator.
     depths (dict, optional): dictionary of depth values for each layer
     space_between (int float): blank space between skeletons in x
     figsize (tuple): size of the plot
@@ -630,47 +820,61 @@ def plot_skeleton_lineup(
             have as a buffer between the edge of the plot to the layer labels.
             Defaults to .01.
     depths_labels (list, optional): list of str labels for each layer. Defaults to None.
+    dtype (np.dtype, optional): dtype of the plotted geometry, i.e. np.float32.
+        Defaults to None, which keeps the dtype of each skeleton.
+    prefetch (int, optional): number of upcoming items to load in background threads
+        while the current one is plotted. Defaults to 0, which loads each item when reached.
+    radius_anno (str, optional): anno table with radius information, for meshwork items
+        with pull_radius. Defaults to 'segment_properties'.
+    basal_anno (str, optional): anno table with (basal) dendrite mesh labels, for meshwork
+        items with pull_compartment_colors. Defaults to 'basal_mesh_labels'.
+    apical_anno (str, optional): anno table with apical mesh labels. can be None.
+        Defaults to 'apical_mesh_labels'.
+    axon_anno (str, optional): anno table with axon labels. Defaults to 'is_axon'.
 
     """
     if ax is None:
         ax = plt.gca()
     x_max = 0
     x_min = 0
-    x_max = 0
 
     x_ax = axis_dict[x]
 
     if depths is not None:
         depths_vals = depths.values()
 
-    for skel in skel_list:
-        current_min = min(skel.vertices[:, x_ax])
+    for skel, skel_radius, compartments in _lineup_skeletons(
+        skel_list,
+        prefetch,
+        dtype=dtype,
+        pull_radius=pull_radius,
+        pull_compartment_colors=pull_compartment_colors,
+        radius_anno=radius_anno,
+        basal_anno=basal_anno,
+        apical_anno=apical_anno,
+        axon_anno=axon_anno,
+    ):
+        current_min = skel.vertices[:, x_ax].min()
         x_offset = space_between + x_max - current_min
 
-        x_offset_add = [0, 0, 0]
-        x_offset_add[x_ax] = x_offset
-
-        skel._vertices = skel.vertices + x_offset_add
-
+        # offset in plot coordinates instead of shifting a copy of every 3d vertex
         if x_min_max is None:
-            x_min = min(x_min, min(skel.vertices[:, x_ax]))
-            x_max = max(x_max, max(skel.vertices[:, x_ax]) + space_between)
+            x_min = min(x_min, current_min + x_offset)
+            x_max = max(x_max, skel.vertices[:, x_ax].max() + x_offset + space_between)
 
         plot_skel(
             skel,
             title=title,
             x=x,
             y="y",
-            pull_radius=pull_radius,
-            radius=radius,
+            radius=skel_radius if skel_radius is not None else radius,
             line_width=line_width,
             plot_soma=plot_soma,
             soma_size=soma_size,
             soma_node=soma_node,
             invert_y=invert_y,
-            skel_colors=skel_colors,
+            skel_colors=skel_colors if skel_colors is not None else compartments,
             skel_alpha=skel_alpha,
-            pull_compartment_colors=pull_compartment_colors,
             color=color,
             skel_color_map=skel_color_map,
             x_min_max=x_min_max,
@@ -678,7 +882,11 @@ def plot_skeleton_lineup(
             capstyle=capstyle,
             joinstyle=joinstyle,
             ax=ax,
+            dtype=dtype,
+            offset=(x_offset, 0),
         )
+        # drop the skeleton before the next one is loaded
+        del skel, skel_radius, compartments
         if depths is not None:
             plot_layer_lines(
                 depths_vals,
@@ -701,3 +909,62 @@ def plot_skeleton_lineup(
         ax, invert_y=invert_y, x_min_max=[x_min, x_max], y_min_max=[y_min, y_max]
     )
     ax.axis(axis_lines)
+
+
+def _lineup_skeletons(items, prefetch, **kwargs):
+    """yields (skeleton, radius, compartments) for each lineup item, loading files when
+    reached or, with prefetch, up to prefetch items ahead in background threads.
+    kwargs are passed to _lineup_skeleton"""
+    load = functools.partial(_lineup_skeleton, **kwargs)
+    if prefetch <= 0:
+        for item in items:
+            yield load(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(load, item))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _lineup_skeleton(
+    item,
+    dtype=None,
+    pull_radius=False,
+    pull_compartment_colors=False,
+    radius_anno="segment_properties",
+    basal_anno="basal_mesh_labels",
+    apical_anno="apical_mesh_labels",
+    axon_anno="is_axon",
+):
+    """loads one lineup item and pulls its radius and compartments, so that only the
+    skeleton is kept of meshworks"""
+    if isinstance(item, (str, os.PathLike)):
+        item = skel_io.read_any(
+            *os.path.split(os.fspath(item)), dtype=dtype, skeleton_only=True
+        )
+    elif isinstance(item, tuple):
+        item = skel_io.read_any(*item, dtype=dtype, skeleton_only=True)
+
+    radius = None
+    compartments = None
+    if hasattr(item, "anno"):
+        # as plot_mw_skel pulls them
+        if pull_radius:
+            radius = utils.pull_mw_rad(item, radius_anno)
+        if pull_compartment_colors:
+            compartments = utils.pull_mw_skel_colors(
+                item, basal_anno, axon_anno, apical_anno
+            )
+        sk = item.skeleton
+    else:
+        sk = item
+        if pull_radius:
+            radius = sk.vertex_properties["radius"]
+        if pull_compartment_colors:
+            compartments = sk.vertex_properties["compartment"]
+    return sk, radius, compartments
@@ -0,0 +1,232 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from . import plot_tools
+
+# serializes the resource tracker patch in _open_segment with segment creation
+_tracker_lock = threading.Lock()
+
+
+class SharedArrays:
+    """puts numpy arrays in shared memory (or memory-mapped files) so worker processes
+    can rebuild views of them without pickling or copying. share() returns a small
+    picklable descriptor to hand to workers, which call attach() on it. every segment
+    is released by close(), or on leaving the with block.
+
+    Args:
+        backend (str, optional): 'shm' for multiprocessing.shared_memory segments or
+            'mmap' for .npy files opened with np.load(mmap_mode='r'). Defaults to 'shm'.
+        directory (str, optional): where the 'mmap' backend writes its files.
+            Defaults to None, which uses a new temporary directory.
+
+    Example:
+        with SharedArrays() as shared:
+            descriptor = shared.share_skeleton(sk, pull_radius=True)
+            pool.submit(render_shared, descriptor, "cell.png", invert_y=True)
+    """
+
+    def __init__(self, backend="shm", directory=None):
+        if backend not in ("shm", "mmap"):
+            raise ValueError(f"backend must be 'shm' or 'mmap', got '{backend}'")
+        self.backend = backend
+        self._segments = []
+        self._directory = directory
+        self._owns_directory = False
+        if backend == "mmap" and directory is None:
+            self._directory = tempfile.mkdtemp(prefix="skeleton_plot_")
+            self._owns_directory = True
+
+    def share(self, arrays):
+        """copies each array once into a shared buffer
+
+        Args:
+            arrays (dict): name -> array. None values are kept as None.
+
+        Returns:
+            descriptor (dict): name -> (backend, location, shape, dtype) to pass to attach()
+        """
+        descriptor = {}
+        for name, array in arrays.items():
+            if array is None:
+                descriptor[name] = None
+                continue
+            array = np.ascontiguousarray(array)
+            if self.backend == "shm":
+                # zero sized segments are not allowed. the lock keeps a concurrent
+                # _open_segment from swallowing this segment's registration
+                with _tracker_lock:
+                    shm = shared_memory.SharedMemory(
+                        create=True, size=max(array.nbytes, 1)
+                    )
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+                self._segments.append(shm)
+                location = shm.name
+            else:
+                location = os.path.join(self._directory, f"{uuid.uuid4().hex}.npy")
+                np.save(location, array)
+                self._segments.append(location)
+            descriptor[name] = (self.backend, location, array.shape, array.dtype.str)
+        return descriptor
+
+    def share_skeleton(
+        self, sk, radius=None, skel_colors=None, pull_radius=False, pull_compartment_colors=False
+    ):
+        """shares the vertices, edges, radius and compartment arrays of a skeleton
+
+        Args:
+            sk (meshparty.skeleton.Skeleton): skeleton to share
+            radius (iterable, optional): radius of each vertex. Defaults to None.
+            skel_colors (iterable, optional): compartment label of each vertex. Defaults to None.
+            pull_radius (bool, optional): use sk.vertex_properties['radius'] as radius.
+                Defaults to False.
+            pull_compartment_colors (bool, optional): use sk.vertex_properties['compartment']
+                as skel_colors. Defaults to False.
+
+        Returns:
+            descriptor (dict): descriptor for attach(), render_shared() or plot_shared()
+        """
+        if pull_radius:
+            radius = sk.vertex_properties["radius"]
+        if skel_colors is None and pull_compartment_colors:
+            skel_colors = sk.vertex_properties["compartment"]
+        return self.share(
+            {
+                "vertices": sk.vertices,
+                "edges": sk.edges,
+                "radius": None if radius is None else np.asarray(radius),
+                "skel_colors": None if skel_colors is None else np.asarray(skel_colors),
+                "soma_node": np.array([int(sk.root)]),
+            }
+        )
+
+    def close(self):
+        """releases every shared segment. arrays attached in workers must be closed first"""
+        for segment in self._segments:
+            if self.backend == "shm":
+                segment.close()
+                segment.unlink()
+            elif os.path.exists(segment):
+                os.remove(segment)
+        self._segments = []
+        if self._owns_directory and os.path.isdir(self._directory):
+            shutil.rmtree(self._directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(descriptor):
+    """rebuilds array views from a SharedArrays descriptor without copying
+
+    Args:
+        descriptor (dict): descriptor returned by SharedArrays.share
+
+    Returns:
+        arrays (dict): name -> read only np.array view (or None)
+        handles (list): open segments. call detach(handles) once the views are no longer used
+    """
+    arrays = {}
+    handles = []
+    for name, entry in descriptor.items():
+        if entry is None:
+            arrays[name] = None
+            continue
+        backend, location, shape, dtype = entry
+        if backend == "shm":
+            shm = _open_segment(location)
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            handles.append(shm)
+        else:
+            array = np.load(location, mmap_mode="r")
+        array.flags.writeable = False
+        arrays[name] = array
+    return arrays, handles
+
+
+def _open_segment(name):
+    """opens an existing segment without registering it with the resource tracker,
+    which would otherwise unlink it when a worker exits. the creating SharedArrays owns
+    the segment."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # track was added in python 3.13. before it, register is swapped for a no-op
+        # while opening. unregistering afterwards is not an option: workers share the
+        # parent's tracker, so it would drop the owner's registration too
+        with _tracker_lock:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                return shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+
+def detach(handles):
+    """closes segments opened by attach"""
+    for shm in handles:
+        shm.close()
+
+
+def plot_shared(descriptor, ax=None, **kwargs):
+    """plots a skeleton shared with SharedArrays.share_skeleton through plot_tools.plot_verts
+
+    Args:
+        descriptor (dict): descriptor returned by SharedArrays.share_skeleton
+        ax (matplotlib.axes, optional): axis on which to plot the skeleton
+            If none is given, will find current axis with plt.gca()
+        **kwargs: passed to plot_tools.plot_verts
+    """
+    arrays, handles = attach(descriptor)
+    try:
+        plot_tools.plot_verts(
+            arrays["vertices"],
+            arrays["edges"],
+            radius=arrays["radius"],
+            skel_colors=arrays["skel_colors"],
+            soma_node=int(arrays["soma_node"][0]),
+            ax=ax,
+            **kwargs,
+        )
+    finally:
+        # plot_verts keeps no view of the arrays: collections hold gathered copies and
+        # interactive plots copy the views they keep (see lod._owned). drop ours before
+        # closing
+        del arrays
+        detach(handles)
+
+
+def render_shared(descriptor, out_path, figsize=(8, 8), dpi=150, **kwargs):
+    """worker entry point: plots a shared skeleton on a new figure and saves it to out_path
+
+    Args:
+        descriptor (dict): descriptor returned by SharedArrays.share_skeleton
+        out_path (str): path of the saved figure
+        figsize (tuple, optional): figure size. Defaults to (8, 8).
+        dpi (int, optional): figure dpi. Defaults to 150.
+        **kwargs: passed to plot_tools.plot_verts
+
+    Returns:
+        out_path (str): path of the saved figure
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figsize)
+    try:
+        plot_shared(descriptor, ax=ax, **kwargs)
+        fig.savefig(out_path, dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return out_path
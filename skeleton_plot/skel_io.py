@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from meshparty import skeleton, meshwork
 try:
@@ -8,7 +9,7 @@ except:
 import os
 import io
 from botocore.exceptions import NoCredentialsError
-from . import utils
+from . import morphometrics, mw_skeleton, utils
 
 SWC_COLUMNS = ('id', 'type', 'x', 'y', 'z', 'radius', 'parent',)
 COLUMN_CASTS = {
@@ -16,6 +17,8 @@ COLUMN_CASTS = {
     'parent': int,
     'type': int
 }
+FLOAT_COLUMNS = ('x', 'y', 'z', 'radius')
+COMPACT_KEYS = ('vertices', 'parent', 'radius', 'compartment')
 
 def read_json(directory, filename):
     '''
@@ -45,40 +48,183 @@ def read_json(directory, filename):
     return js
 
 # will be moved to meshparty?
-def read_skeleton(directory, filename):
+def read_skeleton(directory, filename, dtype=None, validate=True, repair=False):
     """reads skeleton file from cloudfiles style path
 
     Args:
     directory (str): directory location of swc skeleton file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
     filename (str): full .swc filename 
     df (pd.DataFrame, optional): _description_. Defaults to None.
+    dtype (np.dtype, optional): dtype of the vertices and radius, i.e. np.float32. Defaults to None (float64).
+    validate (bool, optional): check the swc topology with validate_swc and raise a ValueError
+        on duplicate ids, several roots, dangling parents or cycles. Defaults to True.
+    repair (bool, optional): repair those issues with validate_swc instead of raising.
+        Defaults to False.
 
     Returns:
         skeleton: (meshparty.meshwork.skeleton) skeleton object containing .swc data
     """
     if '://' not in directory:
-        directory = utils.cloud_path_join(directory, use_file_scheme = True)
+        directory = 'file://' + os.path.abspath(directory)
     
     file_path = utils.cloud_path_join(directory, filename)
-    df = read_swc(file_path)
-    if not all(df.index == df['id']):
-        # remap id and parent to index to 
-        id_map = dict(zip(df['id'], df.index))
-        id_map[-1] = -1
-        df['id'] = [id_map[x] for x in df['id']]
-        df['parent'] = [id_map[x] for x in df['parent']]
-        
-        
+    df = read_swc(file_path, dtype=dtype)
+    if validate or repair:
+        df, report = validate_swc(df, repair=repair)
+        if not report['valid']:
+            raise ValueError(f"invalid swc '{filename}': {format_swc_report(report)}. "
+                             "read with repair=True to repair it")
+
+    # ids and parents as row positions, so roots need not come first
+    parent, _ = _parent_positions(df['id'].values, df['parent'].values)
+    children = np.flatnonzero(parent >= 0)
+    edges = np.column_stack([children, parent[children]])
+    root = int(np.flatnonzero(parent < 0)[0])
+
     verts = df[['x','y','z']].values
-    edges = df[['id','parent']].iloc[1:].values
-    
     sk=skeleton.Skeleton(verts, edges, vertex_properties={'radius':df['radius'], 
-                                            'compartment':df['type']}, root=0,
+                                            'compartment':df['type']}, root=root,
                                             remove_zero_length_edges=False)
     return sk
 
+
+def validate_swc(df, repair=False):
+    """checks the topology of an swc dataframe (as read by read_swc) in a few vectorized
+    passes and optionally repairs it. detects
+        duplicate_ids: ids on more than one row
+        roots: ids of the rows with parent -1. more than one is an issue
+        dangling_parents: ids of rows whose parent id is not in the file
+        parent_after_child: ids of rows listed before their parent (not fatal)
+        cycles: ids of rows in or below a cycle, which never reach a root
+
+    repairing a df with any of these issues keeps the first row of every id, keeps the tree of the main root (a soma,
+    type 1, root if there is one, else the root with the most descendants) and drops
+    every other tree, orphan and cycle. if that root is not a soma but the tree has a soma
+    node, the tree is rerooted on the first soma node. rows are then sorted so every
+    parent comes before its children, with the root first.
+
+    Args:
+        df (pd.DataFrame): swc dataframe with id, type and parent columns
+        repair (bool, optional): return the repaired dataframe. Defaults to False.
+
+    Returns:
+        df (pd.DataFrame): df as given, or repaired with a new index if repair and
+            there were issues
+        report (dict): the ids of each issue above, 'valid' (no fatal issues in the
+            returned df), 'repaired' and 'dropped' (ids of the rows dropped by repair)
+    """
+    ids = df['id'].values
+    types = df['type'].values
+    parent, found = _parent_positions(ids, df['parent'].values)
+    is_root = df['parent'].values < 0
+    dangling = ~is_root & ~found
+
+    rows = np.arange(len(ids))
+    # the first row of each id is where its own id maps to
+    first = _parent_positions(ids, ids)[0] == rows
+    top = _top_ancestors(parent)
+    in_cycle = parent[top] >= 0
+
+    report = {
+        'n_nodes': len(ids),
+        'duplicate_ids': np.unique(ids[~first]).tolist(),
+        'roots': ids[is_root].tolist(),
+        'dangling_parents': ids[dangling].tolist(),
+        'parent_after_child': ids[parent > rows].tolist(),
+        'cycles': ids[in_cycle].tolist(),
+    }
+    report['valid'] = _swc_valid(report)
+    report['repaired'] = False
+    report['dropped'] = []
+    if not repair or (report['valid'] and not report['parent_after_child']):
+        return df, report
+
+    # main root: soma roots first, then the one with the most descendants
+    roots = np.flatnonzero(is_root & first)
+    if len(roots) == 0:
+        raise ValueError('swc has no root to repair from')
+    size = np.bincount(top[~in_cycle], minlength=len(ids))[roots]
+    root = roots[np.lexsort((-size, types[roots] != 1))[0]]
+
+    keep = (top == root) & first & ~in_cycle
+    parent = np.where(keep, parent, -1)
+    soma = np.flatnonzero(keep & (types == 1))
+    if types[root] != 1 and len(soma):
+        parent = _reroot(parent, soma[0])
+        root = soma[0]
+
+    order = np.flatnonzero(keep)
+    order = order[np.argsort(morphometrics.hops(parent)[order], kind='stable')]
+    repaired = df.iloc[order].reset_index(drop=True)
+    repaired['parent'] = np.where(parent[order] < 0, -1, ids[np.maximum(parent[order], 0)])
+
+    report['dropped'] = ids[~keep].tolist()
+    report['repaired'] = True
+    report['valid'] = True
+    return repaired, report
+
+
+def format_swc_report(report):
+    """one line summary of the issues in a validate_swc report"""
+    issues = []
+    for key in ('duplicate_ids', 'dangling_parents', 'cycles', 'parent_after_child'):
+        if report[key]:
+            issues.append(f"{len(report[key])} {key.replace('_', ' ')}")
+    if len(report['roots']) != 1:
+        issues.append(f"{len(report['roots'])} roots")
+    if report['dropped']:
+        issues.append(f"{len(report['dropped'])} dropped by repair")
+    return ', '.join(issues) if issues else 'no issues'
+
+
+def _swc_valid(report):
+    return (len(report['roots']) == 1 and not report['duplicate_ids']
+            and not report['dangling_parents'] and not report['cycles'])
+
+
+def _parent_positions(ids, parents):
+    """row position of each parent id (first row of duplicated ids), -1 for roots and
+    parents not in ids, and whether each parent was found"""
+    rows = np.arange(len(ids))
+    if len(ids) and ids.min() >= 0 and ids.max() < 4 * len(ids) + 1024:
+        # dense ids (the usual 1..n): O(n) lookup table. rows are written last to
+        # first so duplicated ids map to their first row
+        table = np.full(ids.max() + 1, -1)
+        table[ids[::-1]] = rows[::-1]
+        in_range = (parents >= 0) & (parents < len(table))
+        position = np.where(in_range, table[np.where(in_range, parents, 0)], -1)
+        return position, position >= 0
+    sorter = np.argsort(ids, kind='stable')
+    sorted_ids = ids[sorter]
+    position = np.searchsorted(sorted_ids, parents).clip(0, max(len(ids) - 1, 0))
+    found = (parents >= 0) & (sorted_ids[position] == parents) if len(ids) else parents >= 0
+    return np.where(found, sorter[position], -1), found
+
+
+def _top_ancestors(parent):
+    """topmost ancestor of every row by pointer jumping, log2(depth) vectorized passes.
+    rows in or below a cycle end on a row that still has a parent"""
+    top = np.where(parent >= 0, parent, np.arange(len(parent)))
+    for _ in range(int(np.ceil(np.log2(max(len(parent), 2)))) + 1):
+        jumped = top[top]
+        if np.array_equal(jumped, top):
+            break
+        top = jumped
+    return top
+
+
+def _reroot(parent, new_root):
+    """reverses the parents on the path from new_root up to the current root"""
+    path = [new_root]
+    while parent[path[-1]] >= 0:
+        path.append(parent[path[-1]])
+    parent = parent.copy()
+    parent[path[1:]] = path[:-1]
+    parent[new_root] = -1
+    return parent
+
 # to meshparty?
-def read_swc(path, columns=SWC_COLUMNS, sep=' ', casts=COLUMN_CASTS):
+def read_swc(path, columns=SWC_COLUMNS, sep=' ', casts=COLUMN_CASTS, dtype=None):
     """Read an swc file into a pandas dataframe
 
     Args:
@@ -86,6 +232,8 @@ def read_swc(path, columns=SWC_COLUMNS, sep=' ', casts=COLUMN_CASTS):
         columns (tuple, optional): column labels for swc file. Defaults to ('id', 'type', 'x', 'y', 'z', 'radius', 'parent').
         sep (str, optional): separator when reading swc into df. Defaults to ' '.
         casts (dict, optional): type casts for columns in swc. Defaults to {'id': int,'parent': int,'type': int}.
+        dtype (np.dtype, optional): dtype of the x, y, z and radius columns, parsed directly
+            into that dtype. Defaults to None (float64).
 
     Returns:
         df (pd.DataFrame): dataframe of swc data
@@ -93,13 +241,222 @@ def read_swc(path, columns=SWC_COLUMNS, sep=' ', casts=COLUMN_CASTS):
     if isinstance(path, str) and "://" not in path:
         path = "file://" + path
 
-    df = pd.read_csv(path, names=columns, comment='#', sep=sep)
+    float_dtypes = None
+    if dtype is not None:
+        float_dtypes = {c: dtype for c in FLOAT_COLUMNS if c in columns}
+    df = pd.read_csv(path, names=columns, comment='#', sep=sep, dtype=float_dtypes)
     utils.apply_casts(df, casts)
     return df
 
 
 
-def load_mw(directory, filename):
+def write_swc(sk, directory, filename, radius=None, compartment=None, header=None,
+              xyz_scaling=1, float_format='%.4f'):
+    """writes a skeleton to an swc file, root first with every parent written before its children
+
+    Args:
+        sk (meshparty.skeleton.Skeleton): skeleton to write
+        directory (str): local directory or cloudpath as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full .swc filename
+        radius (iterable, optional): radius of each vertex. Defaults to None, which uses
+            sk.vertex_properties['radius'] if present and 0 otherwise.
+        compartment (iterable, optional): swc type of each vertex. Defaults to None, which uses
+            sk.vertex_properties['compartment'] if present and 0 otherwise.
+        header (dict, optional): each key value pair becomes a '# key value' header line. Defaults to None.
+        xyz_scaling (float, optional): vertices are divided by this before writing. Defaults to 1.
+        float_format (str, optional): format of the x, y, z and radius columns. Defaults to '%.4f'.
+
+    Returns:
+        path (str): path of the written file
+    """
+    order, parent = _topological_parents(sk)
+    radius = _vertex_feature(sk, radius, 'radius', 0)
+    compartment = _vertex_feature(sk, compartment, 'compartment', 0)
+
+    verts = np.asarray(sk.vertices)[order] / xyz_scaling
+    df = pd.DataFrame({
+        'id': np.arange(1, len(order) + 1),
+        'type': np.asarray(compartment)[order].astype(int),
+        'x': verts[:, 0],
+        'y': verts[:, 1],
+        'z': verts[:, 2],
+        'radius': np.asarray(radius)[order],
+        'parent': np.where(parent < 0, -1, parent + 1),
+    }, columns=SWC_COLUMNS)
+
+    buf = io.StringIO()
+    if header is not None:
+        for key, value in header.items():
+            buf.write(f'# {key} {value}\n')
+    df.to_csv(buf, sep=' ', header=False, index=False, float_format=float_format)
+    return _write_file(directory, filename, buf.getvalue().encode())
+
+
+def write_compact(sk, directory, filename, radius=None, compartment=None, dtype=np.float32):
+    """writes the skeleton, radius and compartments to a small uncompressed .npz file that
+    read_compact loads without meshparty validation overhead. vertices are stored in
+    topological order so the root is vertex 0.
+
+    Args:
+        sk (meshparty.skeleton.Skeleton): skeleton to write
+        directory (str): local directory or cloudpath as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full .npz filename
+        radius (iterable, optional): radius of each vertex. Defaults to None, which uses
+            sk.vertex_properties['radius'] if present and 0 otherwise.
+        compartment (iterable, optional): swc type of each vertex. Defaults to None, which uses
+            sk.vertex_properties['compartment'] if present and 0 otherwise.
+        dtype (np.dtype, optional): dtype of the stored vertices and radius. Defaults to np.float32.
+
+    Returns:
+        path (str): path of the written file
+    """
+    order, parent = _topological_parents(sk)
+    radius = _vertex_feature(sk, radius, 'radius', 0)
+    compartment = _vertex_feature(sk, compartment, 'compartment', 0)
+
+    buf = io.BytesIO()
+    np.savez(
+        buf,
+        vertices=np.asarray(sk.vertices)[order].astype(dtype),
+        parent=parent.astype(np.int32),
+        radius=np.asarray(radius)[order].astype(dtype),
+        compartment=np.asarray(compartment)[order].astype(np.int16),
+    )
+    return _write_file(directory, filename, buf.getvalue())
+
+
+def read_compact(directory, filename, dtype=None):
+    """reads a skeleton written by write_compact
+
+    Args:
+        directory (str): directory location of the .npz file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full .npz filename
+        dtype (np.dtype, optional): dtype of the vertices and radius. Defaults to None (as stored).
+
+    Returns:
+        skeleton: (meshparty.meshwork.skeleton) skeleton object with radius and compartment
+            vertex_properties, as returned by read_skeleton
+    """
+    with io.BytesIO(_read_file(directory, filename)) as f:
+        with np.load(f) as data:
+            arrays = {key: data[key] for key in COMPACT_KEYS}
+
+    verts = arrays['vertices']
+    if dtype is not None:
+        verts = verts.astype(dtype, copy=False)
+    children = np.flatnonzero(arrays['parent'] >= 0)
+    edges = np.column_stack([children, arrays['parent'][children]])
+
+    sk = skeleton.Skeleton(verts, edges, vertex_properties={
+        'radius': pd.Series(arrays['radius'] if dtype is None else arrays['radius'].astype(dtype)),
+        'compartment': pd.Series(arrays['compartment'].astype(int))}, root=0,
+        remove_zero_length_edges=False)
+    return sk
+
+
+def load_mw_skeleton(directory, filename, anno_tables=None, dtype=None):
+    """loads only the skeleton, mesh to skeleton mapping and anno tables of a meshwork .h5
+    file, skipping the mesh. local files are read lazily so only those datasets are touched.
+    plot_mw_skel accepts the result in place of a meshwork.
+
+    Args:
+        directory (str): directory location of meshwork .h5 file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full .h5 filename
+        anno_tables (list, optional): names of the anno tables to read. Defaults to None, which reads every table.
+        dtype (np.dtype, optional): dtype of the skeleton vertices, i.e. np.float32. Defaults to None (as stored).
+
+    Returns:
+        mw (mw_skeleton.MeshworkSkeleton): skeleton-only meshwork
+    """
+    path = utils.local_file_path(directory, filename)
+    if path is not None:
+        return mw_skeleton.read_mw_skeleton(path, anno_tables=anno_tables, dtype=dtype)
+
+    if cf_imported == False:
+        raise ImportError('cannot use load_mw_skeleton without cloudfiles.Install https://github.com/seung-lab/cloud-files to continue')
+    try:
+        binary = CloudFiles(directory).get(filename)
+    except NoCredentialsError:
+        binary = CloudFiles(directory, use_https=True).get(filename)
+    if binary is None:
+        raise FileNotFoundError(f"filename '{filename}' not found in '{directory}'")
+    with io.BytesIO(binary) as f:
+        return mw_skeleton.read_mw_skeleton(f, anno_tables=anno_tables, dtype=dtype)
+
+
+def read_any(directory, filename, dtype=None, skeleton_only=False):
+    """reads a skeleton or meshwork file, choosing the reader from the file extension:
+    .swc with read_skeleton, .npz with read_compact, .h5 with load_mw
+
+    Args:
+        directory (str): directory location of the file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
+        filename (str): full filename
+        dtype (np.dtype, optional): dtype of the vertices, i.e. np.float32. Defaults to None.
+        skeleton_only (bool, optional): read .h5 files with load_mw_skeleton instead of
+            load_mw. Defaults to False.
+
+    Returns:
+        skeleton (meshparty.skeleton.Skeleton) or meshwork (meshparty.meshwork.Meshwork,
+            or mw_skeleton.MeshworkSkeleton if skeleton_only)
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.swc':
+        return read_skeleton(directory, filename, dtype=dtype)
+    elif ext == '.npz':
+        return read_compact(directory, filename, dtype=dtype)
+    elif ext == '.h5' and skeleton_only:
+        return load_mw_skeleton(directory, filename, dtype=dtype)
+    elif ext == '.h5':
+        return load_mw(directory, filename, dtype=dtype)
+    raise ValueError(f"cannot read '{filename}', expected a .swc, .npz or .h5 file")
+
+
+def _topological_parents(sk):
+    """vertex order with the root first and parents before children, and the parent
+    of each vertex as a position in that order (-1 for the root)"""
+    order = np.argsort(np.asarray(sk.hops_to_root), kind='stable')
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    parent = np.asarray(sk.parent_nodes(order), dtype=np.int64)
+    parent = np.where(parent < 0, -1, position[parent])
+    return order, parent
+
+
+def _vertex_feature(sk, values, name, default):
+    if values is None:
+        values = sk.vertex_properties.get(name, None) if sk.vertex_properties else None
+    if values is None:
+        return np.full(len(sk.vertices), default)
+    return utils.ensure_length(np.asarray(values), len(sk.vertices), feature_name=name)
+
+
+def _read_file(directory, filename):
+    path = utils.local_file_path(directory, filename)
+    if path is not None:
+        with open(path, 'rb') as f:
+            return f.read()
+    if cf_imported == False:
+        raise ImportError('cannot read from cloud paths without cloudfiles.Install https://github.com/seung-lab/cloud-files to continue')
+    binary = CloudFiles(directory).get(filename)
+    if binary is None:
+        raise FileNotFoundError(f"filename '{filename}' not found in '{directory}'")
+    return binary
+
+
+def _write_file(directory, filename, data):
+    path = utils.local_file_path(directory, filename)
+    if path is not None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+    if cf_imported == False:
+        raise ImportError('cannot write to cloud paths without cloudfiles.Install https://github.com/seung-lab/cloud-files to continue')
+    CloudFiles(directory).put(filename, data, compress=None)
+    return utils.cloud_path_join(directory, filename)
+
+
+def load_mw(directory, filename, dtype=None):
     
     # filename = f"{root_id}_{nuc_id}/{root_id}_{nuc_id}.h5"
     '''
@@ -108,6 +465,7 @@ def load_mw(directory, filename):
     Args:
         directory (str): directory location of meshwork .h5 file. in cloudpath format as seen in https://github.com/seung-lab/cloud-files
         filename (str): full .h5 filename 
+        dtype (np.dtype, optional): dtype of the skeleton vertices, i.e. np.float32. Defaults to None (as stored).
 
     Returns:
         meshwork (meshparty.meshwork): meshwork object containing .h5 data 
@@ -126,9 +484,14 @@ def load_mw(directory, filename):
         cf = CloudFiles(directory, use_https=True) # using https (public credentials)
         binary = cf.get([filename])
 
+    if binary[0]['content'] is None:
+        raise FileNotFoundError(f"filename '{filename}' not found in '{directory}'")
 
-    with io.BytesIO(cf.get(binary[0]['path'])) as f:
+    with io.BytesIO(binary[0]['content']) as f:
         f.seek(0)
         mw = meshwork.load_meshwork(f)
 
+    if dtype is not None and mw.skeleton is not None:
+        utils.cast_skeleton_vertices(mw.skeleton, dtype)
+
     return mw
\ No newline at end of file
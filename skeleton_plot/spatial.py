@@ -0,0 +1,115 @@
+import numpy as np
+from scipy import spatial
+
+from . import utils
+
+_index_cache = utils.VertexCache()
+
+
+class SpatialIndex:
+    """k-d tree index over the vertices of a skeleton, for snapping points (i.e. synapses)
+    to their nearest node and for box and radius queries of vertices. use spatial_index(sk)
+    to get the cached index of a skeleton instead of building one.
+
+    Args:
+        sk (meshparty.skeleton.Skeleton): skeleton to index
+    """
+
+    def __init__(self, sk):
+        # no reference to sk is kept, so the cache entry dies with the skeleton
+        self.vertices = np.asarray(sk.vertices)
+        # meshparty builds and caches a 3d cKDTree per skeleton already
+        self.tree = sk.kdtree
+        self._projected_trees = {}
+
+    def snap(self, points, max_distance=None):
+        """finds the nearest skeleton node of every point in one vectorized query
+
+        Args:
+            points (np.array, nx3): points to snap, in the units of the skeleton vertices
+            max_distance (float, optional): points farther than this from every node
+                are given node -1. Defaults to None.
+
+        Returns:
+            nodes (np.array): index of the nearest skeleton vertex of each point
+            distances (np.array): distance from each point to that vertex
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if len(points) == 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        if max_distance is None:
+            distances, nodes = self.tree.query(points, workers=-1)
+        else:
+            distances, nodes = self.tree.query(
+                points, distance_upper_bound=max_distance, workers=-1
+            )
+            nodes = np.where(np.isfinite(distances), nodes, -1)
+        return nodes, distances
+
+    def query_radius(self, center, radius):
+        """indices of the vertices within radius of center (3d)"""
+        return np.sort(self.tree.query_ball_point(np.asarray(center, dtype=float), radius))
+
+    def query_box(self, box_min, box_max):
+        """indices of the vertices inside the axis aligned 3d box [box_min, box_max]"""
+        box_min = np.asarray(box_min, dtype=float)
+        box_max = np.asarray(box_max, dtype=float)
+        center = (box_min + box_max) / 2
+        # a chebyshev ball around the center covers the box, then trim to the box
+        candidates = np.asarray(
+            self.tree.query_ball_point(center, np.max(box_max - center), p=np.inf),
+            dtype=int,
+        )
+        inside = np.all(
+            (self.vertices[candidates] >= box_min) & (self.vertices[candidates] <= box_max),
+            axis=1,
+        )
+        return np.sort(candidates[inside])
+
+    def query_view(self, x_min_max, y_min_max, x="x", y="y"):
+        """indices of the vertices inside a 2d view, i.e. the limits of a zoomed plot
+
+        Args:
+            x_min_max (tuple): x min and x max of the view
+            y_min_max (tuple): y min and y max of the view
+            x (str, optional): which dimension is plotted in x. Defaults to 'x'.
+            y (str, optional): which dimension is plotted in y. Defaults to 'y'.
+
+        Returns:
+            vertex_indices (np.array): sorted indices of the vertices in the view
+        """
+        xy, tree = self._projected_tree(x, y)
+        box_min = np.array([min(x_min_max), min(y_min_max)], dtype=float)
+        box_max = np.array([max(x_min_max), max(y_min_max)], dtype=float)
+        center = (box_min + box_max) / 2
+        candidates = np.asarray(
+            tree.query_ball_point(center, np.max(box_max - center), p=np.inf),
+            dtype=int,
+        )
+        inside = np.all((xy[candidates] >= box_min) & (xy[candidates] <= box_max), axis=1)
+        return np.sort(candidates[inside])
+
+    def _projected_tree(self, x, y):
+        key = (x, y)
+        if key not in self._projected_trees:
+            xy = utils.project_verts(self.vertices, x=x, y=y)
+            self._projected_trees[key] = (xy, spatial.cKDTree(xy))
+        return self._projected_trees[key]
+
+
+def spatial_index(sk):
+    """returns the SpatialIndex of a skeleton, building it on first use. the index is
+    cached per skeleton object and rebuilt if the skeleton vertices change."""
+    return _index_cache.get(sk, sk.vertices, lambda: SpatialIndex(sk))
+
+
+def snap_to_skeleton(sk, points, max_distance=None):
+    """snaps points (i.e. synapse positions) to their nearest skeleton node.
+    see SpatialIndex.snap
+
+    Returns:
+        nodes (np.array): index of the nearest skeleton vertex of each point, or -1
+            if farther than max_distance
+        distances (np.array): distance from each point to that vertex
+    """
+    return spatial_index(sk).snap(points, max_distance=max_distance)
@@ -0,0 +1,445 @@
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import colors as mcolors
+from matplotlib import image as mimage
+from matplotlib.collections import LineCollection
+
+# columns of the segment table shared with the tile workers
+X0, Y0, X1, Y1, R, G, B, A, WIDTH = range(9)
+
+DZI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="{overlap}" TileSize="{tile_size}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+def collect_segments(ax):
+    """gathers the line segments drawn on an axis (i.e. by plot_skeleton_lineup or
+    several plot_skel calls) into one table of two point segments
+
+    Args:
+        ax (matplotlib.axes): axis whose LineCollections are collected. other artists
+            (soma markers, text) are skipped.
+
+    Returns:
+        table (np.array, mx9, float32): x0, y0, x1, y1, r, g, b, a and width in points
+            of every segment
+    """
+    tables = []
+    for collection in ax.collections:
+        if not isinstance(collection, LineCollection):
+            continue
+        lines = collection.get_segments()
+        if len(lines) == 0:
+            continue
+        # colormapped collections compute their colors at draw time
+        collection.update_scalarmappable()
+        colors = _per_line(collection.get_colors(), len(lines))
+        widths = _per_line(np.asarray(collection.get_linewidths()), len(lines))
+
+        lengths = np.array([len(line) for line in lines])
+        points = np.concatenate(lines)
+        # every polyline becomes its consecutive point pairs
+        line_of_point = np.repeat(np.arange(len(lines)), lengths)
+        first = np.flatnonzero(line_of_point[:-1] == line_of_point[1:])
+        line = line_of_point[first]
+        start, end = points[first], points[first + 1]
+        nonzero = np.any(start != end, axis=1)
+
+        table = np.empty((nonzero.sum(), 9), dtype=np.float32)
+        table[:, [X0, Y0]] = start[nonzero]
+        table[:, [X1, Y1]] = end[nonzero]
+        table[:, R : A + 1] = colors[line[nonzero]]
+        table[:, A] *= 1 if collection.get_alpha() is None else collection.get_alpha()
+        table[:, WIDTH] = widths[line[nonzero]]
+        tables.append(table)
+    if not tables:
+        return np.empty((0, 9), dtype=np.float32)
+    return np.concatenate(tables)
+
+
+def _per_line(values, n):
+    values = np.asarray(values)
+    if len(values) == n:
+        return values
+    return np.resize(values, (n,) + values.shape[1:])
+
+
+def write_dzi(ax, directory, name, **kwargs):
+    """renders everything drawn on ax with LineCollections (see collect_segments) as a
+    deep zoom (.dzi) tile pyramid within the current axis limits. see write_dzi_segments
+
+    Returns:
+        dzi_path (str): path of the .dzi file
+    """
+    return write_dzi_segments(
+        collect_segments(ax),
+        directory,
+        name,
+        x_lim=ax.get_xlim(),
+        y_lim=ax.get_ylim(),
+        **kwargs,
+    )
+
+
+def write_dzi_segments(
+    table,
+    directory,
+    name,
+    x_lim=None,
+    y_lim=None,
+    max_size=None,
+    pixels_per_unit=None,
+    tile_size=256,
+    overlap=1,
+    line_scale=1,
+    background="white",
+    n_workers=1,
+    max_tile_segments=50000,
+):
+    """writes a deep zoom image: directory/name.dzi and a name_files/<level>/<col>_<row>.png
+    tile pyramid that opens in OpenSeadragon and other dzi viewers.
+
+    the finest level is drawn from the segments. per level, a binning index lists the
+    tiles each segment's bounds touch; tiles are rendered by worker processes that memory
+    map the segment table and read only the rows of their tile. coarser levels are drawn
+    from the segments too, so lines keep their width, as long as no tile lists more than
+    max_tile_segments segments. from the first level over the cap down, every tile is
+    instead the 2x2 average of the finer level's tiles, so a worker holds at most one
+    tile's segments, or a few child tiles, at a time. empty tiles are copies of one
+    background tile.
+
+    Args:
+        table (np.array, mx9): segment table from collect_segments. an empty table
+            writes blank tiles, and then needs x_lim and y_lim
+        directory (str): local output directory
+        name (str): name of the .dzi file and the _files directory
+        x_lim (tuple, optional): x extent to render. Defaults to None, the segment bounds.
+        y_lim (tuple, optional): y extent to render, (bottom, top) as in ax.get_ylim(),
+            so inverted axes stay inverted. Defaults to None, the segment bounds.
+        max_size (int, optional): pixels of the longer side of the full resolution image.
+            Defaults to None, which is 16384 unless pixels_per_unit is given.
+        pixels_per_unit (float, optional): full resolution pixels per data unit.
+            Defaults to None.
+        tile_size (int, optional): tile size in pixels. Defaults to 256.
+        overlap (int, optional): pixels of overlap between neighbouring tiles. Defaults to 1.
+        line_scale (float, optional): pixels per point of line width. Defaults to 1.
+        background (str, optional): tile background color. Defaults to 'white'.
+        n_workers (int, optional): number of worker processes. Defaults to 1, which
+            renders in this process.
+        max_tile_segments (int, optional): most segments a tile of a coarser level may be
+            drawn from. None draws every level from the segments. Defaults to 50000.
+
+    Returns:
+        dzi_path (str): path of the .dzi file
+    """
+    table = np.asarray(table, dtype=np.float32).reshape(-1, 9)
+    if len(table) == 0 and (x_lim is None or y_lim is None):
+        raise ValueError(
+            "the segment table is empty, give x_lim and y_lim to write a blank pyramid"
+        )
+    if x_lim is None:
+        x_lim = (
+            min(table[:, X0].min(), table[:, X1].min()),
+            max(table[:, X0].max(), table[:, X1].max()),
+        )
+    if y_lim is None:
+        y_lim = (
+            min(table[:, Y0].min(), table[:, Y1].min()),
+            max(table[:, Y0].max(), table[:, Y1].max()),
+        )
+    x_min, x_max = sorted(x_lim)
+    data_width = x_max - x_min
+    data_height = abs(y_lim[1] - y_lim[0])
+    if pixels_per_unit is None:
+        pixels_per_unit = (max_size or 16384) / max(data_width, data_height)
+    width = max(int(math.ceil(data_width * pixels_per_unit)), 1)
+    height = max(int(math.ceil(data_height * pixels_per_unit)), 1)
+    n_levels = int(math.ceil(math.log2(max(width, height)))) + 1
+    grids = [
+        _LevelGrid(
+            level,
+            n_levels,
+            width,
+            height,
+            pixels_per_unit,
+            x_min,
+            y_lim[1],
+            np.sign(y_lim[0] - y_lim[1]) or -1,
+            tile_size,
+            overlap,
+        )
+        for level in range(n_levels)
+    ]
+
+    files_dir = os.path.join(directory, f"{name}_files")
+    for level in range(n_levels):
+        os.makedirs(os.path.join(files_dir, str(level)), exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="skeleton_plot_tiles_")
+    pool = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    try:
+        table_path = os.path.join(work_dir, "segments.npy")
+        np.save(table_path, table)
+        blank_path = os.path.join(work_dir, "blank.png")
+        mimage.imsave(
+            blank_path, np.tile(mcolors.to_rgba(background), (tile_size, tile_size, 1))
+        )
+
+        # levels drawn from the segments, from the finest down to the first over the cap
+        tasks = []
+        first_drawn = n_levels - 1
+        for level in reversed(range(n_levels)):
+            grid = grids[level]
+            order, offsets = grid.bin(table, line_scale)
+            if (
+                level < n_levels - 1
+                and max_tile_segments is not None
+                and np.diff(offsets).max() > max_tile_segments
+            ):
+                break
+            first_drawn = level
+            index_path = os.path.join(work_dir, f"index_{level}.npy")
+            np.save(index_path, order)
+            for tile, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+                col, row = tile % grid.cols, tile // grid.cols
+                tasks.append(
+                    (
+                        grid,
+                        col,
+                        row,
+                        table_path,
+                        index_path,
+                        int(start),
+                        int(stop),
+                        files_dir,
+                        blank_path,
+                        line_scale,
+                        background,
+                    )
+                )
+            del order
+        _run_tasks(pool, _render_tile, tasks)
+
+        # the rest are downsampled, each level once the finer one is written
+        for level in reversed(range(first_drawn)):
+            grid = grids[level]
+            _run_tasks(
+                pool,
+                _downsample_tile,
+                [
+                    (grids[level + 1], grid, col, row, files_dir)
+                    for row in range(grid.rows)
+                    for col in range(grid.cols)
+                ],
+            )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    dzi_path = os.path.join(directory, f"{name}.dzi")
+    with open(dzi_path, "w") as f:
+        f.write(
+            DZI_TEMPLATE.format(
+                overlap=overlap, tile_size=tile_size, width=width, height=height
+            )
+        )
+    return dzi_path
+
+
+def _run_tasks(pool, function, tasks):
+    if pool is None:
+        for task in tasks:
+            function(*task)
+    elif tasks:
+        # list() re-raises the first worker error
+        list(pool.map(function, *zip(*tasks), chunksize=32))
+
+
+class _LevelGrid:
+    """pixel and tile geometry of one pyramid level"""
+
+    def __init__(
+        self,
+        level,
+        n_levels,
+        width,
+        height,
+        pixels_per_unit,
+        x_min,
+        y_top,
+        y_sign,
+        tile_size,
+        overlap,
+    ):
+        self.level = level
+        factor = 2 ** (n_levels - 1 - level)
+        self.width = max(int(math.ceil(width / factor)), 1)
+        self.height = max(int(math.ceil(height / factor)), 1)
+        self.pixels_per_unit = pixels_per_unit / factor
+        self.x_min = x_min
+        self.y_top = y_top
+        # +1 if y grows downwards in the image (inverted axis), -1 otherwise
+        self.y_sign = y_sign
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.cols = int(math.ceil(self.width / tile_size))
+        self.rows = int(math.ceil(self.height / tile_size))
+
+    def to_pixels(self, x, y):
+        return (
+            (x - self.x_min) * self.pixels_per_unit,
+            (y - self.y_top) * self.y_sign * self.pixels_per_unit,
+        )
+
+    def tile_pixels(self, col, row):
+        """pixel bounds (left, top, right, bottom) of a tile including its overlap"""
+        left = max(col * self.tile_size - self.overlap, 0)
+        top = max(row * self.tile_size - self.overlap, 0)
+        right = min((col + 1) * self.tile_size + self.overlap, self.width)
+        bottom = min((row + 1) * self.tile_size + self.overlap, self.height)
+        return left, top, right, bottom
+
+    def bin(self, table, line_scale):
+        """spatial binning index of the segments: segment rows sorted by tile, and the
+        offsets of each tile's rows (csr). a segment is listed in every tile its bounds,
+        padded by half its width and the overlap, touch"""
+        px0, py0 = self.to_pixels(table[:, X0], table[:, Y0])
+        px1, py1 = self.to_pixels(table[:, X1], table[:, Y1])
+        pad = table[:, WIDTH] * line_scale / 2 + self.overlap + 1
+        last_col, last_row = self.cols - 1, self.rows - 1
+        c0 = np.floor((np.minimum(px0, px1) - pad) / self.tile_size).clip(0, last_col)
+        c1 = np.floor((np.maximum(px0, px1) + pad) / self.tile_size).clip(0, last_col)
+        r0 = np.floor((np.minimum(py0, py1) - pad) / self.tile_size).clip(0, last_row)
+        r1 = np.floor((np.maximum(py0, py1) + pad) / self.tile_size).clip(0, last_row)
+        # segments entirely outside the image
+        outside = (
+            (np.maximum(px0, px1) + pad < 0)
+            | (np.minimum(px0, px1) - pad > self.width)
+            | (np.maximum(py0, py1) + pad < 0)
+            | (np.minimum(py0, py1) - pad > self.height)
+        )
+        c0, c1, r0, r1 = (a.astype(np.int64) for a in (c0, c1, r0, r1))
+        n_cols = np.where(outside, 0, c1 - c0 + 1)
+        n_rows = np.where(outside, 0, r1 - r0 + 1)
+        counts = n_cols * n_rows
+
+        # one (tile, segment) pair per tile touched
+        segment = np.repeat(np.arange(len(table)), counts)
+        within = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+        col = c0[segment] + within % n_cols[segment]
+        row = r0[segment] + within // n_cols[segment]
+        tile = row * self.cols + col
+        sort = np.argsort(tile, kind="stable")
+        offsets = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(tile, minlength=self.cols * self.rows))
+        return segment[sort], offsets
+
+
+def _render_tile(
+    grid,
+    col,
+    row,
+    table_path,
+    index_path,
+    start,
+    stop,
+    files_dir,
+    blank_path,
+    line_scale,
+    background,
+):
+    """worker: draws the segments of one tile and writes <level>/<col>_<row>.png"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    out_path = os.path.join(files_dir, str(grid.level), f"{col}_{row}.png")
+    left, top, right, bottom = grid.tile_pixels(col, row)
+    tile_width, tile_height = right - left, bottom - top
+    if start == stop:
+        if tile_width == grid.tile_size and tile_height == grid.tile_size:
+            shutil.copyfile(blank_path, out_path)
+        else:
+            blank = np.tile(mcolors.to_rgba(background), (tile_height, tile_width, 1))
+            mimage.imsave(out_path, blank)
+        return out_path
+
+    rows = np.load(index_path, mmap_mode="r")[start:stop]
+    segments = np.load(table_path, mmap_mode="r")[np.sort(rows)]
+    px0, py0 = grid.to_pixels(segments[:, X0], segments[:, Y0])
+    px1, py1 = grid.to_pixels(segments[:, X1], segments[:, Y1])
+    lines = np.stack([np.stack([px0, py0], axis=1), np.stack([px1, py1], axis=1)], axis=1)
+
+    # 72 dpi so one point of line width is one pixel
+    fig = Figure(figsize=(tile_width / 72, tile_height / 72), dpi=72)
+    fig.patch.set_facecolor(background)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(left, right)
+    ax.set_ylim(bottom, top)
+    ax.add_collection(
+        LineCollection(
+            lines,
+            colors=segments[:, R : A + 1],
+            linewidths=segments[:, WIDTH] * line_scale,
+            capstyle="round",
+            joinstyle="round",
+        )
+    )
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    pixels = np.asarray(canvas.buffer_rgba())
+    # figure sizes are rounded to whole pixels, pad or crop to the exact tile
+    image = np.empty((tile_height, tile_width, 4), dtype=np.uint8)
+    image[...] = np.round(np.array(mcolors.to_rgba(background)) * 255)
+    h, w = min(tile_height, pixels.shape[0]), min(tile_width, pixels.shape[1])
+    image[:h, :w] = pixels[:h, :w]
+    mimage.imsave(out_path, image)
+    return out_path
+
+
+def _downsample_tile(child_grid, grid, col, row, files_dir):
+    """worker: writes <level>/<col>_<row>.png as the 2x2 average of the pixels it covers
+    at the next finer level, read from the (at most 3x3, with overlap) child tiles"""
+    left, top, right, bottom = grid.tile_pixels(col, row)
+    x0, y0 = 2 * left, 2 * top
+    x1 = min(2 * right, child_grid.width)
+    y1 = min(2 * bottom, child_grid.height)
+    size = child_grid.tile_size
+
+    region = np.empty((y1 - y0, x1 - x0, 4), dtype=np.float32)
+    for child_row in range(y0 // size, (y1 - 1) // size + 1):
+        for child_col in range(x0 // size, (x1 - 1) // size + 1):
+            child_path = os.path.join(
+                files_dir, str(child_grid.level), f"{child_col}_{child_row}.png"
+            )
+            child = mimage.imread(child_path)
+            child_left, child_top, _, _ = child_grid.tile_pixels(child_col, child_row)
+            # the child's own pixels, without its overlap, that fall in the region
+            cx0, cx1 = max(child_col * size, x0), min((child_col + 1) * size, x1)
+            cy0, cy1 = max(child_row * size, y0), min((child_row + 1) * size, y1)
+            region[cy0 - y0 : cy1 - y0, cx0 - x0 : cx1 - x0] = child[
+                cy0 - child_top : cy1 - child_top, cx0 - child_left : cx1 - child_left, :4
+            ]
+
+    # odd sized finer levels are one pixel short on the last row or column
+    tile_width, tile_height = right - left, bottom - top
+    region = np.pad(
+        region,
+        (
+            (0, 2 * tile_height - region.shape[0]),
+            (0, 2 * tile_width - region.shape[1]),
+            (0, 0),
+        ),
+        mode="edge",
+    )
+    image = region.reshape(tile_height, 2, tile_width, 2, 4).mean(axis=(1, 3))
+    out_path = os.path.join(files_dir, str(grid.level), f"{col}_{row}.png")
+    mimage.imsave(out_path, np.round(image * 255).astype(np.uint8))
+    return out_path
@@ -1,3 +1,9 @@
+import hashlib
+import json
+import os
+import threading
+import weakref
+
 import numpy as np
 
 axis_dict = {"x": 0, "y": 1, "z": 2}
@@ -33,14 +39,13 @@ def pull_mw_skel_colors(mw, basal_table, axon_table, apical_table):
 
     node_labels[soma_node] = 1
 
-    if axon_table in mw.anno.table_names:
-        axon_nodes = mw.anno[axon_table].skel_index
-
     if apical_table is not None and apical_table in mw.anno.table_names:
         apical_nodes = mw.anno[apical_table].skel_index
         node_labels[apical_nodes] = 4
 
-    node_labels[axon_nodes] = 2
+    if axon_table in mw.anno.table_names:
+        axon_nodes = mw.anno[axon_table].skel_index
+        node_labels[axon_nodes] = 2
 
     if 0 in node_labels:
         print(
@@ -50,6 +55,77 @@ def pull_mw_skel_colors(mw, basal_table, axon_table, apical_table):
     return node_labels
 
 
+def project_verts(vertices, x="x", y="y", dtype=None, offset=None):
+    """selects the x and y columns of vertices into an nx2 array. the cast to dtype
+    and the offset are applied while projecting, so at most one nx2 array is allocated
+
+    Args:
+        vertices (np.array, nx2+): vertices to project
+        x (str or int, optional): which dimension to use as x. Defaults to 'x'.
+        y (str or int, optional): which dimension to use as y. Defaults to 'y'.
+        dtype (np.dtype, optional): dtype of the projected array, i.e. np.float32.
+            Defaults to None, which keeps the dtype of vertices.
+        offset (tuple, optional): (x, y) offset added to the projected vertices.
+            Defaults to None.
+
+    Returns:
+        xy (np.array, nx2): projected vertices
+    """
+    vertices = np.asarray(vertices)
+    if vertices.ndim != 2 or vertices.shape[1] < 2:
+        raise ValueError(f"vertices must be nx2 or nx3, got shape {vertices.shape}")
+    if type(x) == str or type(y) == str:
+        x, y = axis_dict[x], axis_dict[y]
+    if dtype is None:
+        dtype = vertices.dtype if vertices.dtype.kind == "f" else np.float64
+    if (
+        (x, y) == (0, 1)
+        and vertices.shape[1] == 2
+        and vertices.dtype == dtype
+        and offset is None
+    ):
+        return vertices
+
+    xy = np.empty((len(vertices), 2), dtype=dtype)
+    xy[:, 0] = vertices[:, x]
+    xy[:, 1] = vertices[:, y]
+    if offset is not None:
+        xy += np.asarray(offset, dtype=dtype)
+    return xy
+
+
+def cover_path_segments(xy, paths):
+    """builds the segments of every cover path, in path order, with a single gather from
+    the projected vertices, i.e. for one LineCollection of the whole skeleton
+
+    Args:
+        xy (np.array, nx2): projected vertices
+        paths (list): cover paths of vertex indices
+
+    Returns:
+        segments (np.array, mx2x2): segments in the dtype of xy
+        start (np.array): start vertex of each segment, for per segment styles
+    """
+    lengths = np.array([len(path) for path in paths], dtype=np.int64)
+    if len(lengths) == 0:
+        return np.empty((0, 2, 2), dtype=xy.dtype), np.empty(0, dtype=np.int64)
+    vertex = np.concatenate(paths).astype(np.int64)
+    is_start = np.ones(len(vertex), dtype=bool)
+    is_start[np.cumsum(lengths) - 1] = False
+    position = np.flatnonzero(is_start)
+    start = vertex[position]
+    return xy[np.stack([start, vertex[position + 1]], axis=1)], start
+
+
+def cast_skeleton_vertices(sk, dtype):
+    """casts the vertices of a meshparty skeleton to dtype in place, i.e. np.float32"""
+    if sk._rooted.vertices.dtype != dtype:
+        sk._rooted._vertices = sk._rooted.vertices.astype(dtype)
+        sk._reset_derived_properties_rooted()
+        sk._reset_derived_properties_filtered(index_changed=False)
+    return sk
+
+
 def set_xy_lims(
     ax, verts=None, invert_y=False, x_min_max=None, y_min_max=None, x=0, y=1
 ):
@@ -92,6 +168,35 @@ def cloud_path_join(*args, use_file_scheme=False):
     return joined_path
 
 
+def local_file_path(directory, filename):
+    """local path of filename in directory, or None if directory is a cloud path.
+    plain paths and file:// paths are local.
+
+    Args:
+        directory (str): local directory or cloudpath, i.e. 'gs://bucket/swcs'
+        filename (str): name of the file in directory
+
+    Returns:
+        path (str or None): os path of the file, None for cloud paths
+    """
+    if "://" in directory and not directory.startswith("file://"):
+        return None
+    return os.path.join(directory.replace("file://", "", 1), filename)
+
+
+def file_fingerprint(directory, filename):
+    """[size, mtime in ns] of a local file, so edits to it change cache keys. None for
+    cloud paths and missing files"""
+    path = local_file_path(directory, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
 def ensure_length(feature_values, num_elements, feature_name="color"):
     """
     Validates if the color/radius/etc input is a single value or a list/array
@@ -116,3 +221,38 @@ def ensure_length(feature_values, num_elements, feature_name="color"):
 
     else:
         return feature_values
+
+
+class VertexCache:
+    """values derived from an object's vertices (i.e. a spatial index of a skeleton),
+    cached per object. the object is held weakly and an entry is rebuilt when the
+    object's vertices array is replaced.
+
+    Example:
+        _index_cache = VertexCache()
+        index = _index_cache.get(sk, sk.vertices, lambda: SpatialIndex(sk))
+    """
+
+    def __init__(self):
+        self._entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, obj, vertices, build):
+        """the cached value of obj, or build() if there is none or vertices is not the
+        array it was built from"""
+        vertices = np.asarray(vertices)
+        with self._lock:
+            entry = self._entries.get(obj)
+        if entry is not None and entry[0] is vertices:
+            return entry[1]
+        value = build()
+        with self._lock:
+            self._entries[obj] = (vertices, value)
+        return value
+
+
+def stable_hash(*objs):
+    """hex digest of json serializable objects (dict keys sorted, other objects by repr)
+    that is stable across processes and sessions"""
+    payload = json.dumps(objs, sort_keys=True, default=repr)
+    return hashlib.sha1(payload.encode()).hexdigest()
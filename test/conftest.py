@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from meshparty import meshwork, skeleton, trimesh_io
+
+
+def _make_meshwork(n=40):
+    """strip mesh of 2n vertices along x, skeleton vertex i covering mesh columns 2i
+    and 2i+1, with mesh index and point anchored anno tables"""
+    x = np.arange(n) * 100.0
+    vertices = np.r_[
+        np.c_[x, np.zeros(n), np.zeros(n)], np.c_[x, np.full(n, 80.0), np.zeros(n)]
+    ]
+    faces = []
+    for i in range(n - 1):
+        faces += [[i, i + 1, n + i], [i + 1, n + i + 1, n + i]]
+    mesh = trimesh_io.Mesh(vertices, np.array(faces))
+
+    n_skel = n // 2
+    sk = skeleton.Skeleton(
+        np.c_[np.arange(n_skel) * 200.0 + 50, np.full(n_skel, 40.0), np.zeros(n_skel)],
+        np.c_[np.arange(1, n_skel), np.arange(n_skel - 1)],
+        root=0,
+        mesh_to_skel_map=np.r_[np.arange(n) // 2, np.arange(n) // 2],
+    )
+    mw = meshwork.Meshwork(mesh, seg_id=7, skeleton=sk, voxel_resolution=[4, 4, 40])
+    mw.add_annotations(
+        "segment_properties",
+        pd.DataFrame({"mesh_ind": np.arange(2 * n), "r_eff": np.linspace(100, 900, 2 * n)}),
+        index_column="mesh_ind",
+    )
+    mw.add_annotations(
+        "basal_mesh_labels", pd.DataFrame({"mesh_ind": np.arange(0, n, 3)}), index_column="mesh_ind"
+    )
+    # several rows on the same skeleton vertex
+    mw.add_annotations(
+        "axon_mesh_labels", pd.DataFrame({"mesh_ind": [n - 1, n - 2, 2 * n - 1]}), index_column="mesh_ind"
+    )
+    # points close to the skeleton line, where nearest mesh and skeleton vertices agree
+    points = np.c_[np.array([310.0, 1230, 2050, 3310]) / 4, np.full(4, 10.0), np.zeros(4)]
+    mw.add_annotations(
+        "syn",
+        pd.DataFrame({"ctr_pt_position": points.tolist(), "size": [1, 2, 3, 4]}),
+        point_column="ctr_pt_position",
+    )
+    return mw
+
+
+@pytest.fixture
+def make_meshwork():
+    """builds a small meshwork, see _make_meshwork"""
+    return _make_meshwork
@@ -0,0 +1,173 @@
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+import numpy as np
+import pytest
+from matplotlib import colors as mcolors
+from meshparty import skeleton
+
+from skeleton_plot import cache
+
+SOURCE = ("gs://bucket/swcs", "cell_1.swc")
+
+
+def key(**style):
+    return cache.RenderCache().key(SOURCE, **style)
+
+
+def test_norm_and_colormap_keys():
+    assert key(norm=mcolors.Normalize(0, 5)) == key(norm=mcolors.Normalize(0, 5))
+    assert key(norm=mcolors.Normalize(0, 5)) != key(norm=mcolors.Normalize(0, 6))
+    assert key(norm=mcolors.Normalize(1, 5)) != key(norm=mcolors.LogNorm(1, 5))
+    viridis = matplotlib.colormaps["viridis"]
+    assert key(cmap=viridis) == key(cmap=matplotlib.colormaps["viridis"])
+    assert key(cmap=viridis) != key(cmap=matplotlib.colormaps["magma"])
+    assert key(dtype=np.float32) == key(dtype=np.dtype("float32"))
+
+
+def test_colormap_keys_follow_colors():
+    red_blue = mcolors.ListedColormap(["red", "blue"])
+    green_blue = mcolors.ListedColormap(["green", "blue"])
+    assert red_blue.name == green_blue.name
+    assert key(cmap=red_blue) != key(cmap=green_blue)
+    assert key(cmap=red_blue) == key(cmap=mcolors.ListedColormap(["red", "blue"]))
+    assert key(cmap=red_blue) != key(cmap=red_blue.with_extremes(over="black"))
+    smooth = mcolors.LinearSegmentedColormap.from_list("cells", ["red", "blue"])
+    other = mcolors.LinearSegmentedColormap.from_list("cells", ["red", "green"])
+    assert key(cmap=smooth) != key(cmap=other)
+
+
+def test_dict_keys_keep_their_type():
+    assert key(skel_color_map={3: "red"}) != key(skel_color_map={"3": "red"})
+    assert key(skel_color_map={3: "red", 1: "blue"}) == key(
+        skel_color_map={1: "blue", 3: "red"}
+    )
+
+
+def test_unstable_values_raise():
+    with pytest.raises(TypeError):
+        key(color=object())
+
+
+def test_keys_match_across_processes():
+    code = (
+        "import numpy as np\n"
+        "from matplotlib import colors\n"
+        "from skeleton_plot import cache\n"
+        f"print(cache.RenderCache().key({SOURCE!r}, norm=colors.TwoSlopeNorm(0, -1, 1), "
+        "cmap='viridis', radius=np.arange(10.0)))"
+    )
+    other = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()[-1]
+    assert other == key(
+        norm=mcolors.TwoSlopeNorm(0, -1, 1), cmap="viridis", radius=np.arange(10.0)
+    )
+
+
+def test_lru_eviction_by_items():
+    renders = cache.RenderCache(max_items=2)
+    for name in "abc":
+        renders.get_or_render(name, lambda name=name: name.encode())
+    # a is the least recently used and was evicted; b and c stay
+    assert list(renders._memory) == ["b", "c"]
+    renders.get_or_render("b", lambda: pytest.fail("b should be cached"))
+    renders.get_or_render("d", lambda: b"d")
+    assert list(renders._memory) == ["b", "d"]
+    assert renders.stats()["evictions"] == 2
+
+
+def test_lru_eviction_by_bytes():
+    renders = cache.RenderCache(max_bytes=10)
+    renders.get_or_render("a", lambda: b"x" * 6)
+    renders.get_or_render("b", lambda: b"x" * 6)
+    assert list(renders._memory) == ["b"]
+    assert renders.stats()["memory_bytes"] == 6
+
+
+def test_disk_tier_after_clear(tmp_path):
+    renders = cache.RenderCache(directory=str(tmp_path))
+    renders.get_or_render("a" * 40, lambda: b"image")
+    renders.clear()
+    assert renders.get_or_render("a" * 40, lambda: pytest.fail("on disk")) == b"image"
+    stats = renders.stats()
+    assert stats["renders"] == 1 and stats["disk_hits"] == 1
+
+    renders.clear(disk=True)
+    assert renders.get_or_render("a" * 40, lambda: b"again") == b"again"
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_requests_render_once():
+    renders = cache.RenderCache()
+    release = threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        release.wait(10)
+        return b"image"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(renders.get_or_render, "k", render) for _ in range(5)]
+        wait_for(lambda: renders.stats()["coalesced"] == 4)
+        release.set()
+        assert [f.result() for f in futures] == [b"image"] * 5
+    assert len(calls) == 1
+    assert renders.stats()["renders"] == 1
+
+
+def test_errors_reach_waiting_callers():
+    renders = cache.RenderCache()
+    release = threading.Event()
+
+    def render():
+        release.wait(10)
+        raise RuntimeError("render failed")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(renders.get_or_render, "k", render) for _ in range(3)]
+        wait_for(lambda: renders.stats()["coalesced"] == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="render failed"):
+                future.result()
+    assert renders._in_flight == {}
+    assert renders.stats()["errors"] == 1
+    # nothing was cached, the next request renders again
+    assert renders.get_or_render("k", lambda: b"image") == b"image"
+
+
+def test_stats_counts():
+    renders = cache.RenderCache()
+    assert renders.stats()["hit_rate"] is None
+    renders.get_or_render("a", lambda: b"abc")
+    renders.get_or_render("a", lambda: b"abc")
+    renders.get_or_render("b", lambda: b"de")
+    stats = renders.stats()
+    assert stats["requests"] == 3
+    assert stats["renders"] == 2 and stats["memory_hits"] == 1
+    assert stats["hit_rate"] == stats["memory_hit_rate"] == 1 / 3
+    assert stats["memory_items"] == 2 and stats["memory_bytes"] == 5
+
+
+def test_render_skeleton():
+    n = 50
+    vertices = np.c_[np.arange(n), np.sin(np.arange(n)), np.zeros(n)]
+    sk = skeleton.Skeleton(vertices, np.c_[np.arange(1, n), np.arange(n - 1)], root=0)
+    renders = cache.RenderCache()
+    png = renders.render(sk, dpi=20, color="red")
+    assert png.startswith(b"\x89PNG")
+    assert renders.render(sk, dpi=20, color="red") == png
+    assert renders.render(sk, dpi=20, color="blue") != png
+    assert renders.stats()["renders"] == 2
@@ -0,0 +1,88 @@
+import json
+
+import matplotlib
+import numpy as np
+
+from skeleton_plot import cli
+from trees import write_random_swc
+
+
+def manifest(tmp_path):
+    write_random_swc(tmp_path / "a.swc")
+    write_random_swc(tmp_path / "b.swc", seed=1)
+    return [
+        {"directory": str(tmp_path), "filename": "a.swc", "dpi": 20},
+        {"directory": str(tmp_path), "filename": "b.swc", "dpi": 20},
+    ]
+
+
+def test_resume_keeps_summary(tmp_path):
+    items, out_dir = manifest(tmp_path), str(tmp_path / "out")
+    first = cli.run_manifest(items, out_dir)
+    assert first["run"]["n_rendered"] == 2 and first["n_done"] == 2
+
+    second = cli.run_manifest(items, out_dir)
+    assert second["run"]["n_rendered"] == 0
+    assert second["run"]["n_skipped"] == 2
+    assert second["n_done"] == 2
+    assert second["timings"] == first["timings"]
+    with open(tmp_path / "out" / cli.SUMMARY_FILE) as f:
+        assert json.load(f)["timings"] == first["timings"]
+
+
+def test_failures_clear_on_success(tmp_path):
+    items, out_dir = manifest(tmp_path), str(tmp_path / "out")
+    (tmp_path / "b.swc").unlink()
+    first = cli.run_manifest(items, out_dir)
+    assert first["n_done"] == 1 and first["n_failed"] == 1
+
+    write_random_swc(tmp_path / "b.swc", seed=1)
+    second = cli.run_manifest(items, out_dir)
+    assert second["n_done"] == 2 and second["n_failed"] == 0 and second["n_pending"] == 0
+
+
+def test_run_options_change_outputs(tmp_path):
+    items, out_dir = manifest(tmp_path), str(tmp_path / "out")
+    cli.run_manifest(items, out_dir)
+    float32 = cli.run_manifest(items, out_dir, dtype=np.float32)
+    assert float32["run"]["n_rendered"] == 2
+    svg = cli.run_manifest(items, out_dir, fmt="svg")
+    assert svg["run"]["n_rendered"] == 2
+    assert all(name.endswith(".svg") for name in svg["timings"])
+
+
+def test_render_leaves_backend(tmp_path):
+    backend = matplotlib.get_backend()
+    items = manifest(tmp_path)
+    cli.render_item(items[0], str(tmp_path / "a.png"))
+    assert matplotlib.get_backend() == backend
+    assert (tmp_path / "a.png").stat().st_size > 0
+
+
+def test_skel_color_map_from_manifest(tmp_path):
+    write_random_swc(tmp_path / "a.swc", compartments=(3,))
+    color_map = '{""1"": ""olive"", ""3"": ""firebrick""}'
+    with open(tmp_path / "manifest.csv", "w") as f:
+        f.write("directory,filename,pull_compartment_colors,skel_color_map,dpi\n")
+        f.write(f'{tmp_path},a.swc,true,"{color_map}",20\n')
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump(
+            {
+                "defaults": {"skel_color_map": {"1": "olive", "3": "firebrick"}},
+                "items": [{"directory": str(tmp_path), "filename": "a.swc", "dpi": 20}],
+            },
+            f,
+        )
+
+    for name in ("manifest.csv", "manifest.json"):
+        items = cli.read_manifest(str(tmp_path / name))
+        assert items[0]["skel_color_map"] == {1: "olive", 3: "firebrick"}
+    items[0]["pull_compartment_colors"] = True
+    summary = cli.run_manifest(str(tmp_path / "manifest.csv"), str(tmp_path / "out"))
+    assert summary["n_failed"] == 0 and summary["n_done"] == 1
+    # items given as dicts with string keys are converted too
+    summary = cli.run_manifest(
+        [{**items[0], "skel_color_map": {"1": "olive", "3": "firebrick"}}],
+        str(tmp_path / "out2"),
+    )
+    assert summary["n_failed"] == 0
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from skeleton_plot import convert, skel_io, utils
+
+
+@pytest.mark.parametrize("fmt", ["swc", "compact"])
+def test_convert_meshworks(tmp_path, make_meshwork, fmt):
+    mw = make_meshwork()
+    mw.save_meshwork(str(tmp_path / "a.h5"))
+    mw.save_meshwork(str(tmp_path / "b.h5"))
+    out = tmp_path / "out"
+
+    results, failures = convert.convert_meshworks(
+        str(tmp_path),
+        ["a.h5", "b.h5", "missing.h5"],
+        str(out),
+        fmt=fmt,
+        n_workers=1,
+        axon_anno="axon_mesh_labels",
+    )
+
+    extension = convert.EXTENSIONS[fmt]
+    assert results == {name: str(out / f"{name[0]}{extension}") for name in ["a.h5", "b.h5"]}
+    assert list(failures) == ["missing.h5"]
+    assert isinstance(failures["missing.h5"], FileNotFoundError)
+    assert "missing.h5" in str(failures["missing.h5"])
+
+    sk = skel_io.read_any(str(out), f"a{extension}")
+    assert np.allclose(sk.vertices, mw.skeleton.vertices)
+    # swc keeps 4 decimals
+    assert np.allclose(
+        sk.vertex_properties["radius"], utils.pull_mw_rad(mw, "segment_properties"), atol=1e-4
+    )
+    assert np.array_equal(
+        sk.vertex_properties["compartment"],
+        utils.pull_mw_skel_colors(mw, "basal_mesh_labels", "axon_mesh_labels", None),
+    )
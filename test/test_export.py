@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from matplotlib import colors as mcolors
+
+from skeleton_plot import export
+
+
+@pytest.mark.parametrize("scheme", ["", "file://"])
+def test_export_round_trip(tmp_path, scheme):
+    rng = np.random.default_rng(0)
+    vertices = rng.uniform(0, 1000, size=(100, 3))
+    edges = np.c_[np.arange(1, 100), np.arange(99)]
+    labels = rng.choice([1, 2, 3], size=100)
+    directory = f"{scheme}{tmp_path / 'out'}"
+
+    manifest = export.export_verts(
+        vertices, edges, directory, "cell", radius=np.full(100, 2.5), skel_colors=labels
+    )
+    arrays, loaded = export.load_export(directory, "cell")
+
+    assert loaded == manifest
+    assert np.abs(arrays["positions"] - vertices).max() <= manifest["scale"]
+    assert np.array_equal(arrays["segments"], edges)
+    assert np.allclose(arrays["radius"], 2.5)
+    palette = {1: "olive", 2: "steelblue", 3: "firebrick"}
+    expected = mcolors.to_rgba_array([palette[x] for x in labels])
+    assert np.allclose(arrays["colors"], expected, atol=1e-4)
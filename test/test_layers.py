@@ -0,0 +1,33 @@
+import numpy as np
+from matplotlib.path import Path
+
+from skeleton_plot.layers import LayerGeometry
+
+LAYER_JSON = {
+    "layer_polygons": [
+        {"name": "L1", "path": [[0, 0], [10, 0], [10, 5], [0, 5]]},
+        {"name": "L2", "path": [[0, 5], [10, 5], [12, 9], [4, 12], [0, 9]]},
+    ],
+    "pia_path": {"path": [[0, 0], [10, 0]]},
+}
+
+
+def test_assign_matches_matplotlib_path():
+    geometry = LayerGeometry(LAYER_JSON, res=1)
+    points = np.random.default_rng(0).uniform(-2, 14, size=(5000, 2))
+    labels = geometry.assign(points, chunk_size=128)
+
+    expected = np.full(len(points), -1)
+    for i, poly in reversed(list(enumerate(geometry.polygons))):
+        expected[Path(poly).contains_points(points)] = i
+    on_edge = np.isin(points, [0, 5, 9, 10]).any(axis=1)
+    assert np.array_equal(labels[~on_edge], expected[~on_edge])
+
+
+def test_assign_non_finite_points():
+    geometry = LayerGeometry(LAYER_JSON, res=1)
+    assert np.array_equal(geometry.assign(np.full((3, 3), np.nan)), [-1, -1, -1])
+
+    points = np.array([[5, 2, 0], [np.nan, 1, 0], [5, 7, 0]] * 3)
+    labels = geometry.assign(points, chunk_size=2)
+    assert np.array_equal(labels, [0, -1, 1] * 3)
@@ -0,0 +1,91 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from skeleton_plot import lod, plot_tools
+
+
+def line(n=1025):
+    """one unbranched path along x"""
+    vertices = np.c_[np.arange(n, dtype=float), np.sin(np.arange(n) / 50), np.cos(np.arange(n) / 50)]
+    edges = np.c_[np.arange(1, n), np.arange(n - 1)]
+    return vertices, edges
+
+
+@pytest.mark.parametrize(
+    "x_lim, target", [((0, 1024), 100), ((0, 1024), 5000), ((100, 164), 100), ((500, 504), 1)]
+)
+def test_select_finest_level_under_target(x_lim, target):
+    vertices, _ = line()
+    skeleton_lod = lod.SkeletonLOD(vertices[:, :2], [np.arange(len(vertices))])
+    level, visible = skeleton_lod.select(x_lim, (-1, 1), target)
+
+    counts = [len(skeleton_lod.visible(k, x_lim, (-1, 1))) for k in range(len(skeleton_lod.levels))]
+    assert np.array_equal(visible, skeleton_lod.visible(level, x_lim, (-1, 1)))
+    assert counts[level] <= target or level == len(counts) - 1
+    assert level == 0 or counts[level - 1] > target
+    # every level still spans the whole path
+    for start, end in skeleton_lod.levels:
+        assert start[0] == 0 and end[-1] == len(vertices) - 1
+
+
+def plot_interactive(vertices, edges, **kwargs):
+    fig, ax = plt.subplots()
+    plot_tools.plot_verts(vertices, edges, ax=ax, interactive=True, **kwargs)
+    (collection,) = ax.collections
+    return fig, ax, collection
+
+
+def test_zoom_swaps_level_once_per_draw(monkeypatch):
+    vertices, edges = line()
+    fig, ax, collection = plot_interactive(vertices, edges, lod_segments=64)
+    handler = collection._lod_handler
+    fig.canvas.draw()
+    coarse = handler.level
+    assert coarse > 0
+    assert len(collection.get_segments()) <= 64
+
+    calls = []
+    update = lod.LODHandler.update
+    monkeypatch.setattr(lod.LODHandler, "update", lambda self: calls.append(1) or update(self))
+    ax.set_xlim(500, 520)
+    ax.set_ylim(-5, 5)
+    # limits only mark the plot stale, the segments follow on the next draw
+    assert handler.level == coarse
+    fig.canvas.draw()
+    assert len(calls) == 1
+    assert handler.level == 0
+    segments = np.asarray(collection.get_segments())
+    assert segments[:, :, 0].min() >= 500 - 5 - 1 and segments[:, :, 0].max() <= 520 + 5 + 1
+
+    handler.disconnect()
+    ax.set_xlim(0, 1024)
+    fig.canvas.draw()
+    assert handler.level == 0
+    plt.close(fig)
+
+
+def test_pyramid_cached_per_skeleton():
+    vertices, edges = line()
+    figures = []
+    pyramids = []
+    for kwargs in [{}, {}, {"soma_node": 3}, {"x": "x", "y": "z"}]:
+        fig, _, collection = plot_interactive(vertices, edges, **kwargs)
+        figures.append(fig)
+        pyramids.append(collection._lod_handler.lod)
+    assert pyramids[0] is pyramids[1]
+    assert pyramids[2] is not pyramids[0] and pyramids[3] is not pyramids[0]
+
+    # new arrays, even if equal, get a new pyramid
+    fig, _, collection = plot_interactive(vertices.copy(), edges)
+    figures.append(fig)
+    assert collection._lod_handler.lod is not pyramids[0]
+    fig, _, collection = plot_interactive(vertices, edges.copy())
+    figures.append(fig)
+    assert collection._lod_handler.lod is not pyramids[0]
+    for fig in figures:
+        plt.close(fig)
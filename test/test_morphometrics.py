@@ -0,0 +1,70 @@
+import sys
+
+import numpy as np
+import pytest
+from meshparty import skeleton
+
+from skeleton_plot import morphometrics
+from trees import random_tree, tree_edges
+
+
+def reference_orders(parent):
+    """strahler and branch order by plain recursion over the children"""
+    children = [[] for _ in parent]
+    for child, p in enumerate(parent):
+        if p >= 0:
+            children[p].append(child)
+    strahler = np.zeros(len(parent), dtype=int)
+    branch = np.zeros(len(parent), dtype=int)
+
+    def visit(v, order):
+        branch[v] = order
+        below = [visit(c, order + (len(children[v]) > 1)) for c in children[v]]
+        if not below:
+            strahler[v] = 1
+        elif len(below) == 1:
+            strahler[v] = below[0]
+        else:
+            highest = max(below)
+            strahler[v] = highest + (below.count(highest) > 1)
+        return strahler[v]
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 10 * len(parent)))
+    try:
+        for root in np.flatnonzero(parent < 0):
+            visit(root, 0)
+    finally:
+        sys.setrecursionlimit(limit)
+    return strahler, branch
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_orders_match_recursion(seed):
+    _, parent = random_tree(seed=seed)
+    strahler, branch = reference_orders(parent)
+    assert np.array_equal(morphometrics.branch_order(parent), branch)
+    assert np.array_equal(morphometrics.strahler_order(parent), strahler)
+
+
+def test_forest_orders_match_recursion():
+    _, parent = random_tree(seed=3)
+    parent[[500, 1200]] = -1
+    strahler, branch = reference_orders(parent)
+    assert np.array_equal(morphometrics.branch_order(parent), branch)
+    assert np.array_equal(morphometrics.strahler_order(parent), strahler)
+
+
+def test_distances_match_meshparty():
+    vertices, parent = random_tree()
+    edges = tree_edges(parent)
+    sk = skeleton.Skeleton(vertices, edges, root=0, remove_zero_length_edges=False)
+    metrics = morphometrics.morphometrics(sk)
+    assert np.allclose(metrics.path_distance, sk.distance_to_root)
+    assert np.array_equal(metrics.hops, sk.hops_to_root)
+
+
+def test_cycle_raises():
+    parent = np.array([-1, 0, 3, 2])
+    with pytest.raises(ValueError):
+        morphometrics.hops(parent)
@@ -0,0 +1,88 @@
+import io
+import tempfile
+
+import h5py
+import numpy as np
+import pytest
+from meshparty.meshwork import meshwork_io
+
+from skeleton_plot import mw_skeleton, skel_io, utils
+
+INDEX_TABLES = ["segment_properties", "basal_mesh_labels", "axon_mesh_labels"]
+
+
+@pytest.fixture(params=[False, True], ids=["full", "masked"])
+def meshwork_file(tmp_path, request, make_meshwork):
+    mw = make_meshwork()
+    if request.param:
+        mw.apply_mask(mw.mesh.vertices[:, 0] > 1000)
+    mw.save_meshwork(str(tmp_path / "cell.h5"))
+    return str(tmp_path), "cell.h5"
+
+
+@pytest.mark.parametrize("buffered", [False, True], ids=["path", "buffer"])
+def test_matches_load_mw(meshwork_file, buffered):
+    directory, filename = meshwork_file
+    full = skel_io.load_mw(directory, filename)
+    if buffered:
+        with open(f"{directory}/{filename}", "rb") as f:
+            part = mw_skeleton.read_mw_skeleton(io.BytesIO(f.read()))
+    else:
+        part = skel_io.load_mw_skeleton(directory, filename)
+
+    assert np.array_equal(part.skeleton.vertices, full.skeleton.vertices)
+    assert np.array_equal(part.skeleton.edges, full.skeleton.edges)
+    assert part.skeleton.root == full.skeleton.root
+    assert np.array_equal(
+        part.skeleton_indices.to_mesh_region_point, full.skeleton_indices.to_mesh_region_point
+    )
+    assert np.array_equal(
+        utils.pull_mw_rad(part, "segment_properties"), utils.pull_mw_rad(full, "segment_properties")
+    )
+    assert np.array_equal(
+        utils.pull_mw_skel_colors(part, "basal_mesh_labels", "axon_mesh_labels", None),
+        utils.pull_mw_skel_colors(full, "basal_mesh_labels", "axon_mesh_labels", None),
+    )
+    for name in INDEX_TABLES:
+        assert np.array_equal(part.anno[name].skel_index, full.anno[name].skel_index)
+        assert np.array_equal(
+            part.anno[name].df["mesh_ind_filt"].values, full.anno[name].df["mesh_ind_filt"].values
+        )
+    assert np.array_equal(part.anno.syn.skel_index, full.anno.syn.skel_index)
+    assert np.array_equal(part.anno.syn.df["size"].values, full.anno.syn.df["size"].values)
+
+
+def test_skel_index_is_unique(meshwork_file):
+    part = skel_io.load_mw_skeleton(*meshwork_file)
+    skel_index = part.anno.axon_mesh_labels.skel_index
+    assert len(part.anno.axon_mesh_labels) == 3
+    assert np.array_equal(skel_index, np.unique(skel_index))
+    assert len(skel_index) == 1
+
+
+def test_version_1_buffer_copied_once(tmp_path, monkeypatch, make_meshwork):
+    make_meshwork().save_meshwork(str(tmp_path / "cell.h5"))
+    with h5py.File(tmp_path / "cell.h5", "a") as f:
+        f.attrs["version"] = 1
+    # version 1 tables are hdf tables that pandas reads from a path. the file holds
+    # version 2 tables, so read them back with the version 2 reader
+    sources = []
+
+    def load(source, name):
+        sources.append(source)
+        return meshwork_io.anno_load_function[2](source, name)
+
+    monkeypatch.setitem(meshwork_io.anno_load_function, 1, load)
+    copies = []
+    named_temporary_file = tempfile.NamedTemporaryFile
+
+    def counted(*args, **kwargs):
+        copies.append(kwargs)
+        return named_temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", counted)
+
+    part = mw_skeleton.read_mw_skeleton(io.BytesIO((tmp_path / "cell.h5").read_bytes()))
+    assert len(copies) == 1
+    assert len(sources) == len(part.anno.table_names) == 4
+    assert len(set(sources)) == 1 and isinstance(sources[0], str)
@@ -0,0 +1,253 @@
+from types import SimpleNamespace
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib import colors as mcolors
+from matplotlib.collections import LineCollection
+from meshparty import skeleton
+
+from skeleton_plot import morphometrics, plot_tools, skel_io, utils
+import trees
+
+
+def random_skeleton(n=3000, seed=0, offset=(4.2e5, 7.1e5, 1.9e5)):
+    """random tree in nm-scale coordinates, edges in mixed orientation"""
+    vertices, parent = trees.random_tree(n, seed=seed, scale=500, offset=offset)
+    edges = trees.tree_edges(parent)
+    flip = np.random.default_rng(seed).random(len(edges)) < 0.5
+    edges[flip] = edges[flip][:, ::-1]
+    return vertices, edges
+
+
+def plotted(vertices, edges, **kwargs):
+    fig, ax = plt.subplots()
+    plot_tools.plot_verts(vertices, edges, ax=ax, plot_soma=True, **kwargs)
+    segments = np.concatenate(
+        [np.asarray(c.get_segments()) for c in ax.collections if isinstance(c, LineCollection)]
+    )
+    soma = [c for c in ax.collections if not isinstance(c, LineCollection)]
+    soma = np.asarray(soma[0].get_offsets())
+    plt.close(fig)
+    return segments, soma
+
+
+@pytest.mark.parametrize("soma_node", [0, 1234])
+def test_cover_paths_match_meshparty(soma_node):
+    vertices, edges = random_skeleton()
+    sk = skeleton.Skeleton(
+        vertices, edges.copy(), root=soma_node, remove_zero_length_edges=False
+    )
+    parent = morphometrics.rooted_parent_array(edges, len(vertices), root=soma_node)
+    paths = morphometrics.cover_paths(vertices, parent)
+    expected = sk.cover_paths_with_parent()
+    assert len(paths) == len(expected)
+    for path, path_expected in zip(paths, expected):
+        assert np.array_equal(path, path_expected)
+
+
+def test_float32_segments_and_soma():
+    vertices, edges = random_skeleton()
+    segments, soma = plotted(vertices, edges, soma_node=17)
+    segments32, soma32 = plotted(vertices, edges, soma_node=17, dtype=np.float32)
+
+    assert segments.shape == segments32.shape
+    # float32 keeps 24 bits, so errors are relative to the coordinate magnitude
+    tolerance = np.abs(vertices).max() * 2**-23
+    assert np.abs(segments32 - segments).max() <= tolerance
+    assert np.abs(soma32 - soma).max() <= tolerance
+    assert np.allclose(soma, vertices[17, :2])
+
+
+def test_plot_mw_skel_synapses_by_compartment():
+    vertices, edges = random_skeleton(n=500)
+    sk = skeleton.Skeleton(vertices, edges, root=0, remove_zero_length_edges=False)
+    labels = np.where(np.arange(500) < 250, 3, 2)
+    syn_res = np.array([4, 4, 40])
+    # each synapse sits next to one node, given in voxels
+    syn_nodes = np.array([10, 100, 260, 400, 499])
+    positions = (vertices[syn_nodes] + 1.0) / syn_res
+    mw = SimpleNamespace(
+        skeleton=sk,
+        anno={"pre_syn": pd.DataFrame({"pre_pt_position": list(positions)})},
+    )
+    skel_mask = np.arange(500) != 100
+    skel_color_map = {3: "firebrick", 2: "steelblue", 1: "olive"}
+
+    fig, ax = plt.subplots()
+    plot_tools.plot_mw_skel(
+        mw,
+        plot_presyn=True,
+        plot_postsyn=False,
+        syn_res=syn_res,
+        skel_colors=labels,
+        skel_color_map=skel_color_map,
+        color_syn_by_compartment=True,
+        syn_skel_mask=skel_mask,
+    )
+    synapses = [c for c in ax.collections if not isinstance(c, LineCollection)][0]
+    kept = syn_nodes[skel_mask[syn_nodes]]
+    assert np.allclose(synapses.get_offsets(), vertices[kept, :2] + 1.0)
+    expected = mcolors.to_rgba_array([skel_color_map[c] for c in labels[kept]])
+    assert np.allclose(synapses.get_facecolors(), expected)
+
+    with pytest.raises(ValueError, match="syn_skel_mask"):
+        plot_tools.plot_mw_skel(
+            mw, plot_presyn=True, plot_postsyn=False, syn_res=syn_res, syn_skel_mask=skel_mask[:-1]
+        )
+    plt.close(fig)
+
+
+def test_plot_verts_single_collection():
+    vertices, edges = random_skeleton(n=500)
+    labels = np.random.default_rng(2).choice([2, 3], size=500)
+    skel_color_map = {2: "steelblue", 3: "firebrick"}
+    fig, ax = plt.subplots()
+    plot_tools.plot_verts(
+        vertices, edges, ax=ax, skel_colors=labels, skel_color_map=skel_color_map, radius=np.arange(500.0)
+    )
+    (lc,) = [c for c in ax.collections if isinstance(c, LineCollection)]
+    segments = np.asarray(lc.get_segments())
+    plt.close(fig)
+
+    # one segment per edge, starting at the child as seen from the root
+    assert segments.shape == (len(edges), 2, 2)
+    parent = morphometrics.rooted_parent_array(edges, len(vertices), root=0)
+    start = np.array([np.flatnonzero(np.all(vertices[:, :2] == s[0], axis=1))[0] for s in segments])
+    end = np.array([np.flatnonzero(np.all(vertices[:, :2] == s[1], axis=1))[0] for s in segments])
+    assert np.all((parent[start] == end) | (parent[end] == start))
+    assert len({tuple(sorted(pair)) for pair in zip(start, end)}) == len(edges)
+    expected = mcolors.to_rgba_array([skel_color_map[c] for c in labels[start]])
+    assert np.allclose(lc.get_colors(), expected)
+    assert np.allclose(lc.get_linewidths(), start)
+
+
+def lineup(items, **kwargs):
+    """segments, colors and widths of each skeleton plotted by plot_skeleton_lineup"""
+    fig, ax = plt.subplots()
+    plot_tools.plot_skeleton_lineup(items, ax=ax, **kwargs)
+    plotted = [
+        (np.asarray(c.get_segments()), c.get_colors(), c.get_linewidths())
+        for c in ax.collections
+        if isinstance(c, LineCollection)
+    ]
+    plt.close(fig)
+    return plotted
+
+
+def lineup_skeletons(n_skeletons=3):
+    skeletons = []
+    for seed in range(n_skeletons):
+        vertices, edges = random_skeleton(n=300, seed=seed)
+        rng = np.random.default_rng(seed)
+        skeletons.append(
+            skeleton.Skeleton(
+                np.round(vertices, 2),
+                edges,
+                root=0,
+                vertex_properties={
+                    "radius": np.round(rng.uniform(1, 5, 300), 2),
+                    "compartment": rng.choice([2, 3], 300),
+                },
+                remove_zero_length_edges=False,
+            )
+        )
+    return skeletons
+
+
+def assert_same_lineup(plotted, expected):
+    assert len(plotted) == len(expected)
+    for (segments, colors, widths), (segments_expected, colors_expected, widths_expected) in zip(
+        plotted, expected
+    ):
+        assert np.allclose(segments, segments_expected)
+        assert np.allclose(colors, colors_expected)
+        assert np.allclose(widths, widths_expected)
+
+
+def test_lineup_generator_and_no_mutation():
+    skeletons = lineup_skeletons()
+    vertices = [sk.vertices.copy() for sk in skeletons]
+    kwargs = dict(space_between=1000, pull_radius=True, pull_compartment_colors=True, dtype=np.float32)
+
+    plotted = lineup((sk for sk in skeletons), **kwargs)
+    assert_same_lineup(plotted, lineup(skeletons, **kwargs))
+    for sk, original in zip(skeletons, vertices):
+        assert sk.vertices.dtype == np.float64
+        assert np.array_equal(sk.vertices, original)
+
+    # laid out left to right. space_between is added after each skeleton and again
+    # before the next, as the lineup always has
+    x_ranges = [(s[:, :, 0].min(), s[:, :, 0].max()) for s, _, _ in plotted]
+    for (_, right), (left, _) in zip(x_ranges, x_ranges[1:]):
+        assert left - right == pytest.approx(2000, abs=1)
+    radius = np.asarray(skeletons[0].vertex_properties["radius"])
+    assert np.allclose(plotted[0][2], radius[plotted_starts(skeletons[0])])
+
+
+def plotted_starts(sk):
+    parent = morphometrics.rooted_parent_array(sk.edges, len(sk.vertices), root=sk.root)
+    paths = morphometrics.cover_paths(sk.vertices, parent)
+    return utils.cover_path_segments(sk.vertices[:, :2], paths)[1]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_lineup_files(tmp_path, prefetch):
+    skeletons = lineup_skeletons()
+    for i, sk in enumerate(skeletons):
+        skel_io.write_swc(sk, str(tmp_path), f"{i}.swc")
+    kwargs = dict(pull_radius=True, pull_compartment_colors=True)
+    expected = lineup(skeletons, **kwargs)
+
+    items = [str(tmp_path / "0.swc"), (str(tmp_path), "1.swc"), (str(tmp_path), "2.swc")]
+    assert_same_lineup(lineup(iter(items), prefetch=prefetch, **kwargs), expected)
+
+
+def test_lineup_meshwork_anno_tables(tmp_path, make_meshwork):
+    mw = make_meshwork()
+    mw.save_meshwork(str(tmp_path / "cell.h5"))
+    skel_color_map = {0: "gray", 1: "olive", 2: "steelblue", 3: "firebrick"}
+    # the skeleton is a flat line, so the view is given
+    kwargs = dict(
+        pull_radius=True, pull_compartment_colors=True, skel_color_map=skel_color_map, y_min_max=(0, 100)
+    )
+
+    plotted = lineup(
+        [(str(tmp_path), "cell.h5")],
+        radius_anno="segment_properties",
+        axon_anno="axon_mesh_labels",
+        apical_anno=None,
+        **kwargs,
+    )
+    expected = lineup(
+        [mw.skeleton],
+        radius=utils.pull_mw_rad(mw, "segment_properties"),
+        skel_colors=utils.pull_mw_skel_colors(mw, "basal_mesh_labels", "axon_mesh_labels", None),
+        skel_color_map=skel_color_map,
+        y_min_max=(0, 100),
+    )
+    assert_same_lineup(plotted, expected)
+
+
+def test_plot_verts_leaves_norm_unscaled():
+    vertices, edges = random_skeleton(n=200)
+    norm = mcolors.Normalize()
+    fig, ax = plt.subplots()
+    for values in (np.arange(200.0), np.arange(200.0) * 10):
+        plot_tools.plot_verts(vertices, edges, ax=ax, skel_colors=values, cmap="viridis", norm=norm)
+    assert not norm.scaled()
+    # each plot is scaled to its own values
+    first, second = [c.norm for c in ax.collections]
+    assert (first.vmax, second.vmax) == (199, 1990)
+
+    # a scaled norm is kept
+    plot_tools.plot_verts(
+        vertices, edges, ax=ax, skel_colors=np.arange(200.0), cmap="viridis", norm=mcolors.Normalize(0, 50)
+    )
+    assert ax.collections[-1].norm.vmax == 50
+    plt.close(fig)
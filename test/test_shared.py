@@ -0,0 +1,80 @@
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker
+
+import numpy as np
+import pytest
+
+from skeleton_plot import shared
+
+
+def attached_sum(descriptor):
+    arrays, handles = shared.attach(descriptor)
+    try:
+        return float(arrays["values"].sum())
+    finally:
+        del arrays
+        shared.detach(handles)
+
+
+def test_worker_exit_keeps_segment():
+    values = np.arange(1000, dtype=float)
+    with shared.SharedArrays() as arrays:
+        descriptor = arrays.share({"values": values})
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(attached_sum, descriptor).result() == values.sum()
+        # the worker has exited; the segment must still be there
+        assert attached_sum(descriptor) == values.sum()
+
+
+def test_attach_from_threads():
+    register = resource_tracker.register
+    values = np.arange(1000, dtype=float)
+    with shared.SharedArrays() as arrays:
+        descriptor = arrays.share({"values": values})
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sums = list(pool.map(attached_sum, [descriptor] * 64))
+    assert sums == [values.sum()] * 64
+    assert resource_tracker.register is register
+
+
+PLOT_SHARED_AFTER_DETACH = """
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from skeleton_plot import shared
+
+n = 500
+vertices = np.cumsum(np.random.default_rng(0).normal(size=(n, {dims})), axis=0)
+edges = np.c_[np.arange(1, n), np.arange(n - 1)]
+with shared.SharedArrays() as arrays:
+    descriptor = arrays.share(
+        {{
+            "vertices": vertices,
+            "edges": edges,
+            "radius": None,
+            "skel_colors": {colors},
+            "soma_node": np.array([0]),
+        }}
+    )
+    fig, ax = plt.subplots()
+    shared.plot_shared(descriptor, ax=ax, interactive=True, cmap={cmap})
+# the segments are gone, zooming must only touch copies
+ax.set_xlim(vertices[:, 0].min(), vertices[:, 0].mean())
+ax.set_ylim(vertices[:, 1].min(), vertices[:, 1].mean())
+fig.canvas.draw()
+print("ok")
+"""
+
+
+@pytest.mark.parametrize(
+    "dims, colors, cmap", [(2, None, None), (3, "np.linspace(0, 1, n)", "'viridis'")]
+)
+def test_interactive_plot_outlives_segments(dims, colors, cmap):
+    # run apart from the test process: a view of an unmapped segment crashes python
+    code = PLOT_SHARED_AFTER_DETACH.format(dims=dims, colors=colors, cmap=cmap)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "ok"
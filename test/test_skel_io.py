@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from meshparty import skeleton
+from scipy import spatial
+
+from skeleton_plot import skel_io
+from trees import random_tree, tree_edges
+
+
+@pytest.fixture
+def sk():
+    """random tree whose vertex order is not topological and whose root is not 0"""
+    n = 300
+    vertices, parent = random_tree(n, scale=1000)
+    rng = np.random.default_rng(0)
+    # new index of each vertex
+    order = rng.permutation(n)
+    shuffled = np.empty_like(vertices)
+    shuffled[order] = np.round(vertices, 3)
+    return skeleton.Skeleton(
+        shuffled,
+        order[tree_edges(parent)],
+        root=int(order[0]),
+        vertex_properties={
+            "radius": np.round(rng.uniform(100, 500, n), 3),
+            "compartment": rng.choice([1, 2, 3, 4], n),
+        },
+        remove_zero_length_edges=False,
+    )
+
+
+def assert_same_skeleton(read, sk, atol):
+    # written vertices are reordered, match them back by position
+    distance, original = spatial.cKDTree(sk.vertices).query(read.vertices)
+    assert np.all(distance <= atol)
+    assert len(np.unique(original)) == len(sk.vertices)
+
+    assert original[read.root] == sk.root
+    assert {tuple(edge) for edge in original[read.edges]} == {
+        tuple(edge) for edge in sk.edges
+    }
+    assert np.allclose(
+        read.vertex_properties["radius"], sk.vertex_properties["radius"][original], atol=atol
+    )
+    assert np.array_equal(
+        read.vertex_properties["compartment"], sk.vertex_properties["compartment"][original]
+    )
+
+
+def test_swc_round_trip(sk, tmp_path):
+    path = skel_io.write_swc(sk, str(tmp_path), "cell.swc", header={"source": "test"})
+    assert path == str(tmp_path / "cell.swc")
+    read = skel_io.read_skeleton(str(tmp_path), "cell.swc")
+    assert_same_skeleton(read, sk, atol=1e-3)
+    # root first, parents before children
+    assert read.root == 0
+    assert np.all(read.edges[:, 0] > read.edges[:, 1])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_compact_round_trip(sk, tmp_path, dtype):
+    skel_io.write_compact(sk, str(tmp_path), "cell.npz", dtype=dtype)
+    read = skel_io.read_compact(str(tmp_path), "cell.npz")
+    assert read.vertices.dtype == dtype
+    # float32 keeps 24 bits of the coordinates
+    assert_same_skeleton(read, sk, atol=0 if dtype == np.float64 else 1e5 * 2**-23)
+    assert read.root == 0
+
+
+def test_explicit_features_override_properties(sk, tmp_path):
+    skel_io.write_compact(
+        sk, str(tmp_path), "cell.npz", radius=np.ones(len(sk.vertices)), compartment=np.full(len(sk.vertices), 3)
+    )
+    read = skel_io.read_compact(str(tmp_path), "cell.npz")
+    assert np.all(read.vertex_properties["radius"] == 1)
+    assert np.all(read.vertex_properties["compartment"] == 3)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from meshparty import skeleton
+
+from skeleton_plot import spatial, utils
+
+
+@pytest.fixture
+def sk():
+    rng = np.random.default_rng(0)
+    n = 2000
+    vertices = rng.uniform(0, 1e5, size=(n, 3))
+    edges = np.c_[np.arange(1, n), (rng.random(n - 1) * np.arange(1, n)).astype(int)]
+    return skeleton.Skeleton(vertices, edges, root=0, remove_zero_length_edges=False)
+
+
+def test_snap_matches_brute_force(sk):
+    points = np.random.default_rng(1).uniform(-1e4, 1.1e5, size=(500, 3))
+    nodes, distances = spatial.snap_to_skeleton(sk, points)
+
+    all_distances = np.linalg.norm(points[:, None] - sk.vertices[None], axis=2)
+    assert np.array_equal(nodes, all_distances.argmin(axis=1))
+    assert np.allclose(distances, all_distances.min(axis=1))
+
+
+def test_snap_max_distance(sk):
+    points = np.r_[sk.vertices[:3] + 1.0, [[1e7, 1e7, 1e7]]]
+    nodes, distances = spatial.snap_to_skeleton(sk, points, max_distance=10)
+    assert np.array_equal(nodes, [0, 1, 2, -1])
+    assert np.isinf(distances[-1])
+
+    nodes, _ = spatial.snap_to_skeleton(sk, np.empty((0, 3)), max_distance=10)
+    assert len(nodes) == 0
+
+
+def test_query_box_matches_mask(sk):
+    index = spatial.spatial_index(sk)
+    box_min, box_max = np.array([1e4, 2e4, 0]), np.array([6e4, 3e4, 8e4])
+    mask = np.all((sk.vertices >= box_min) & (sk.vertices <= box_max), axis=1)
+    assert np.array_equal(index.query_box(box_min, box_max), np.flatnonzero(mask))
+
+
+@pytest.mark.parametrize("x, y", [("x", "y"), ("z", "x")])
+def test_query_view_matches_mask(sk, x, y):
+    index = spatial.spatial_index(sk)
+    # limits given max first, as an inverted axis reports them
+    x_min_max, y_min_max = (7e4, 2e4), (1e4, 4e4)
+    xy = sk.vertices[:, [utils.axis_dict[x], utils.axis_dict[y]]]
+    mask = (
+        (xy[:, 0] >= 2e4) & (xy[:, 0] <= 7e4) & (xy[:, 1] >= 1e4) & (xy[:, 1] <= 4e4)
+    )
+    assert np.array_equal(
+        index.query_view(x_min_max, y_min_max, x=x, y=y), np.flatnonzero(mask)
+    )
+
+
+def test_spatial_index_cached(sk):
+    assert spatial.spatial_index(sk) is spatial.spatial_index(sk)
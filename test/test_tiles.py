@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pytest
+from matplotlib import image as mimage
+
+from skeleton_plot import tiles
+
+
+def segment_table(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 1000, size=(n, 2))
+    end = start + rng.normal(scale=20, size=(n, 2))
+    table = np.zeros((n, 9), dtype=np.float32)
+    table[:, [tiles.X0, tiles.Y0]] = start
+    table[:, [tiles.X1, tiles.Y1]] = end
+    table[:, tiles.A] = 1
+    table[:, tiles.WIDTH] = 2
+    return table
+
+
+def read_pyramid(directory, name):
+    files_dir = os.path.join(directory, f"{name}_files")
+    return {
+        (int(level), filename): mimage.imread(os.path.join(files_dir, level, filename))
+        for level in os.listdir(files_dir)
+        for filename in os.listdir(os.path.join(files_dir, level))
+    }
+
+
+def check_tile_sizes(pyramid, max_size):
+    n_levels = max(level for level, _ in pyramid) + 1
+    for (level, filename), image in pyramid.items():
+        col, row = map(int, filename[:-4].split("_"))
+        grid = tiles._LevelGrid(level, n_levels, max_size, max_size, 1, 0, 0, 1, 256, 1)
+        left, top, right, bottom = grid.tile_pixels(col, row)
+        assert image.shape[:2] == (bottom - top, right - left)
+
+
+@pytest.mark.parametrize("max_tile_segments", [None, 100])
+def test_pyramid_levels(tmp_path, max_tile_segments):
+    table = segment_table()
+    tiles.write_dzi_segments(
+        table,
+        str(tmp_path),
+        "cells",
+        x_lim=(0, 1000),
+        y_lim=(1000, 0),
+        max_size=1000,
+        max_tile_segments=max_tile_segments,
+    )
+    pyramid = read_pyramid(str(tmp_path), "cells")
+    assert max(level for level, _ in pyramid) == 10
+    check_tile_sizes(pyramid, 1000)
+    # no level is left blank, down to the 1x1 pixel average of level 0
+    for level in range(11):
+        assert pyramid[(level, "0_0.png")][..., :3].min() < 0.95
+
+
+def test_downsampled_level_matches_finer(tmp_path):
+    table = segment_table()
+    kwargs = dict(x_lim=(0, 1000), y_lim=(1000, 0), max_size=1000)
+    tiles.write_dzi_segments(
+        table, str(tmp_path), "cells", max_tile_segments=0, **kwargs
+    )
+    pyramid = read_pyramid(str(tmp_path), "cells")
+    # level 9 (500 px) is the 2x2 mean of level 10 (1000 px, 4x4 tiles of 256 px)
+    full = np.zeros((1000, 1000, 4), dtype=np.float32)
+    for (level, filename), image in pyramid.items():
+        if level == 10:
+            col, row = map(int, filename[:-4].split("_"))
+            x0, y0 = max(col * 256 - 1, 0), max(row * 256 - 1, 0)
+            full[y0 : y0 + image.shape[0], x0 : x0 + image.shape[1]] = image
+    expected = full.reshape(500, 2, 500, 2, 4).mean(axis=(1, 3))
+    tile = pyramid[(9, "1_1.png")]
+    expected = expected[255 : 255 + tile.shape[0], 255 : 255 + tile.shape[1]]
+    assert np.abs(tile - expected).max() <= 1 / 255
+
+
+def test_workers_match(tmp_path):
+    table = segment_table()
+    kwargs = dict(
+        x_lim=(0, 1000), y_lim=(1000, 0), max_size=1000, max_tile_segments=100
+    )
+    for n_workers, out in [(1, "one"), (2, "two")]:
+        tiles.write_dzi_segments(
+            table, str(tmp_path / out), "cells", n_workers=n_workers, **kwargs
+        )
+    one = read_pyramid(str(tmp_path / "one"), "cells")
+    two = read_pyramid(str(tmp_path / "two"), "cells")
+    assert one.keys() == two.keys()
+    for key in one:
+        assert np.array_equal(one[key], two[key])
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_empty_table_writes_blank_pyramid(tmp_path, n_workers):
+    empty = np.empty((0, 9), dtype=np.float32)
+    with pytest.raises(ValueError, match="empty"):
+        tiles.write_dzi_segments(empty, str(tmp_path), "empty")
+
+    tiles.write_dzi_segments(
+        empty,
+        str(tmp_path),
+        "empty",
+        x_lim=(0, 1000),
+        y_lim=(1000, 0),
+        max_size=1000,
+        n_workers=n_workers,
+    )
+    pyramid = read_pyramid(str(tmp_path), "empty")
+    assert max(level for level, _ in pyramid) == 10
+    check_tile_sizes(pyramid, 1000)
+    for image in pyramid.values():
+        assert np.all(image[..., :3] == 1)
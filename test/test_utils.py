@@ -0,0 +1,29 @@
+import gc
+
+import numpy as np
+
+from skeleton_plot import utils
+
+
+class Holder:
+    def __init__(self, vertices):
+        self.vertices = vertices
+
+
+def test_vertex_cache():
+    cache = utils.VertexCache()
+    obj = Holder(np.zeros((3, 3)))
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert cache.get(obj, obj.vertices, build) == 1
+    assert cache.get(obj, obj.vertices, build) == 1
+    obj.vertices = np.ones((3, 3))
+    assert cache.get(obj, obj.vertices, build) == 2
+
+    del obj
+    gc.collect()
+    assert len(cache._entries) == 0
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from skeleton_plot import skel_io
+from trees import write_swc
+
+
+def swc(ids, parents, types=None):
+    n = len(ids)
+    rows = np.arange(n, dtype=float)
+    return pd.DataFrame(
+        {
+            "id": np.asarray(ids),
+            "type": np.asarray(types if types is not None else [1] + [3] * (n - 1)),
+            "x": rows,
+            "y": rows * 2,
+            "z": rows * 3,
+            "radius": np.ones(n),
+            "parent": np.asarray(parents),
+        }
+    )
+
+
+def assert_tree(df):
+    """every parent is an earlier row of df, and there is one root, first"""
+    position = {i: row for row, i in enumerate(df["id"])}
+    assert len(position) == len(df)
+    assert df["parent"].iloc[0] == -1
+    for row, parent in enumerate(df["parent"].iloc[1:], start=1):
+        assert position[parent] < row
+
+
+def test_valid_tree():
+    df, report = skel_io.validate_swc(swc([1, 2, 3, 4], [-1, 1, 2, 2]))
+    assert report["valid"] and not report["repaired"]
+    assert report["roots"] == [1]
+    for key in ("duplicate_ids", "dangling_parents", "parent_after_child", "cycles"):
+        assert report[key] == []
+
+
+def test_parent_after_child_is_sorted():
+    df = swc([3, 1, 2], [2, -1, 1], types=[3, 1, 3])
+    _, report = skel_io.validate_swc(df)
+    assert report["valid"] and report["parent_after_child"] == [3]
+
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert report["repaired"] and report["dropped"] == []
+    assert repaired["id"].tolist() == [1, 2, 3]
+    assert_tree(repaired)
+
+
+def test_duplicate_ids_keep_first_row():
+    df = swc([1, 2, 3, 3], [-1, 1, 2, 1])
+    _, report = skel_io.validate_swc(df)
+    assert not report["valid"] and report["duplicate_ids"] == [3]
+
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert report["valid"] and report["dropped"] == [3]
+    assert repaired["parent"].tolist() == [-1, 1, 2]
+    assert repaired["x"].tolist() == [0, 1, 2]
+
+
+def test_several_roots_keep_the_soma_tree():
+    # the tree of root 10 is larger, but root 1 is a soma
+    ids = [1, 2, 10, 11, 12, 13]
+    df = swc(ids, [-1, 1, -1, 10, 11, 12], types=[1, 3, 3, 3, 3, 3])
+    _, report = skel_io.validate_swc(df)
+    assert not report["valid"] and report["roots"] == [1, 10]
+
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert repaired["id"].tolist() == [1, 2]
+    assert report["dropped"] == [10, 11, 12, 13]
+
+
+def test_several_roots_keep_the_largest_tree():
+    df = swc([1, 2, 10, 11, 12], [-1, 1, -1, 10, 11], types=[3] * 5)
+    repaired, _ = skel_io.validate_swc(df, repair=True)
+    assert repaired["id"].tolist() == [10, 11, 12]
+
+
+def test_dangling_parents_are_dropped():
+    df = swc([1, 2, 3, 4], [-1, 1, 99, 3])
+    _, report = skel_io.validate_swc(df)
+    assert not report["valid"] and report["dangling_parents"] == [3]
+
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert repaired["id"].tolist() == [1, 2]
+    assert report["dropped"] == [3, 4]
+
+
+def test_cycles_are_dropped():
+    # 3 and 4 point at each other, 5 hangs below the cycle
+    df = swc([1, 2, 3, 4, 5], [-1, 1, 4, 3, 4])
+    _, report = skel_io.validate_swc(df)
+    assert not report["valid"] and report["cycles"] == [3, 4, 5]
+
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert repaired["id"].tolist() == [1, 2]
+    assert report["dropped"] == [3, 4, 5]
+
+
+def test_repair_reroots_on_the_soma():
+    # root 1 is a dendrite node, the soma is node 3 further down
+    df = swc([1, 2, 3, 4, 5], [-1, 1, 2, 3, 99], types=[3, 3, 1, 3, 3])
+    repaired, report = skel_io.validate_swc(df, repair=True)
+    assert report["valid"]
+    parents = dict(zip(repaired["id"], repaired["parent"]))
+    assert parents == {3: -1, 2: 3, 1: 2, 4: 3}
+    assert repaired["id"].iloc[0] == 3
+    assert_tree(repaired)
+
+
+def test_sparse_ids_match_dense_ids():
+    rng = np.random.default_rng(0)
+    n = 500
+    parents = np.r_[-1, [rng.integers(0, i) for i in range(1, n)]]
+    order = rng.permutation(n)
+    dense = swc(np.arange(n)[order] + 1, np.where(parents < 0, -1, parents + 1)[order])
+    dense.loc[10, "parent"] = 10**6
+    dense.loc[20, "id"] = dense.loc[21, "id"]
+
+    # ids far beyond 4 * n take the searchsorted path of _parent_positions
+    sparse = dense.copy()
+    sparse["id"] = dense["id"] * 10**7
+    sparse["parent"] = np.where(dense["parent"] < 0, -1, dense["parent"] * 10**7)
+
+    _, dense_report = skel_io.validate_swc(dense)
+    _, sparse_report = skel_io.validate_swc(sparse)
+    keys = ("duplicate_ids", "roots", "dangling_parents", "parent_after_child", "cycles")
+    for key in keys:
+        assert [i * 10**7 if i > 0 else i for i in dense_report[key]] == sparse_report[key]
+
+    dense_repaired, _ = skel_io.validate_swc(dense, repair=True)
+    sparse_repaired, _ = skel_io.validate_swc(sparse, repair=True)
+    assert np.array_equal(dense_repaired["id"] * 10**7, sparse_repaired["id"])
+    assert_tree(sparse_repaired)
+
+
+def test_parent_positions():
+    ids = np.array([5, 3, 9, 3])
+    parents = np.array([-1, 5, 3, 7])
+    for scale in (1, 10**9):
+        scaled_parents = np.where(parents < 0, -1, parents * scale)
+        position, found = skel_io._parent_positions(ids * scale, scaled_parents)
+        assert position.tolist() == [-1, 0, 1, -1]
+        assert found.tolist() == [False, True, True, False]
+
+
+def test_top_ancestors_and_reroot():
+    parent = np.array([-1, 0, 1, 1, 5, 4])
+    top = skel_io._top_ancestors(parent)
+    assert top[:4].tolist() == [0, 0, 0, 0]
+    # rows in a cycle end on a row that still has a parent
+    assert (parent[top[4:]] >= 0).all()
+
+    rerooted = skel_io._reroot(parent[:4], 3)
+    assert rerooted.tolist() == [1, 3, 1, -1]
+    assert parent.tolist() == [-1, 0, 1, 1, 5, 4]
+
+
+def test_read_skeleton(tmp_path):
+    df = swc([1, 2, 3, 4], [-1, 1, 2, 99])
+    write_swc(tmp_path / "bad.swc", df)
+    with pytest.raises(ValueError, match="dangling parents"):
+        skel_io.read_skeleton(str(tmp_path), "bad.swc")
+
+    sk = skel_io.read_skeleton(str(tmp_path), "bad.swc", repair=True)
+    assert len(sk.vertices) == 3
+    sk = skel_io.read_skeleton(str(tmp_path), "bad.swc", validate=False)
+    assert len(sk.vertices) == 4
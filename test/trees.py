@@ -0,0 +1,73 @@
+"""random trees and swc files shared by the tests and benchmarks"""
+import numpy as np
+import pandas as pd
+
+SWC_COLUMNS = ["id", "type", "x", "y", "z", "radius", "parent"]
+
+
+def random_tree(n=2000, seed=0, branch_probability=0.05, scale=1, offset=(0, 0, 0)):
+    """random tree of mostly unbranched runs. each vertex continues from the previous one
+    or, with branch_probability, starts a branch off a random earlier vertex
+
+    Args:
+        n (int, optional): number of vertices. Defaults to 2000.
+        seed (int, optional): random seed. Defaults to 0.
+        branch_probability (float, optional): chance of a vertex starting a branch.
+            Defaults to 0.05.
+        scale (float, optional): standard deviation of the steps between a vertex and its
+            parent. Defaults to 1.
+        offset (tuple, optional): added to every vertex, i.e. nm-scale coordinates.
+            Defaults to (0, 0, 0).
+
+    Returns:
+        vertices (np.array, nx3): vertex positions
+        parent (np.array): parent of each vertex, -1 for the root (vertex 0). parents come
+            before their children
+    """
+    rng = np.random.default_rng(seed)
+    parent = np.arange(n) - 1
+    branches = np.flatnonzero(rng.random(n) < branch_probability)
+    parent[branches] = (rng.random(len(branches)) * branches).astype(int)
+    parent[0] = -1
+    steps = rng.normal(scale=scale, size=(n, 3))
+    vertices = np.zeros((n, 3))
+    for i in range(1, n):
+        vertices[i] = vertices[parent[i]] + steps[i]
+    return vertices + np.asarray(offset, dtype=float), parent
+
+
+def tree_edges(parent):
+    """(child, parent) edges of a parent array"""
+    children = np.flatnonzero(parent >= 0)
+    return np.c_[children, parent[children]]
+
+
+def swc_table(vertices, parent, types=None, radius=None):
+    """swc rows of a tree, with ids one more than the vertex indices"""
+    n = len(vertices)
+    return pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "type": np.ones(n, dtype=int) if types is None else np.asarray(types),
+            "x": vertices[:, 0],
+            "y": vertices[:, 1],
+            "z": vertices[:, 2],
+            "radius": np.ones(n) if radius is None else np.asarray(radius),
+            "parent": np.where(parent < 0, -1, parent + 1),
+        },
+        columns=SWC_COLUMNS,
+    )
+
+
+def write_swc(path, df):
+    """writes swc rows as they are, without checking them"""
+    df[SWC_COLUMNS].to_csv(path, sep=" ", header=False, index=False, float_format="%.3f")
+
+
+def write_random_swc(path, n=200, seed=0, compartments=(2, 3, 4), **kwargs):
+    """writes a random_tree (kwargs are passed to it) as an swc whose root is type 1 and
+    whose other vertices are drawn from compartments, with random radius"""
+    vertices, parent = random_tree(n, seed=seed, **kwargs)
+    rng = np.random.default_rng(seed)
+    types = np.r_[1, rng.choice(compartments, n - 1)]
+    write_swc(path, swc_table(vertices, parent, types, rng.random(n) * 500 + 100))